@@ -0,0 +1,103 @@
+import hashlib
+from flask import Blueprint, request, jsonify, make_response
+from flask_login import login_required
+from werkzeug.http import is_resource_modified
+from app import db, cache, get_books_page, parse_after
+from auth import check_rights
+import mysql.connector
+
+bp_api = Blueprint('api', __name__, url_prefix='/api')
+
+BOOK_COLUMNS = ('id', 'name', 'description', 'year', 'publishing', 'author', 'pages', 'cover')
+FIELDS = BOOK_COLUMNS + ('genres',)
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+def read_fields():
+    value = request.args.get('fields')
+    if not value:
+        return FIELDS
+    fields = tuple(field for field in FIELDS if field in value.split(','))
+    return fields or FIELDS
+
+
+def book_json(row, fields):
+    book = row._asdict()
+    data = {field: book.get(field) for field in fields if field != 'genres'}
+    if 'genres' in fields:
+        data['genres'] = book['genres'].split(', ') if book.get('genres') else []
+    return data
+
+
+def validators():
+    # Last-Modified не отдаём: время версии каталога не совпадает со временем последней записи.
+    # С версиями в памяти процесса ETag не выдаётся вовсе — воркеры не видят чужих изменений
+    if not cache.shared:
+        return None
+    version = cache.version('catalog')
+    return hashlib.md5(f'{version}:{request.full_path}'.encode()).hexdigest()
+
+
+def not_modified(etag):
+    return etag is not None and not is_resource_modified(request.environ, etag=etag)
+
+
+def with_validators(response, etag):
+    # Ответ доступен только после входа: общие кэши не должны отдавать его другим
+    response.vary.add('Cookie')
+    if etag is not None:
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+    return response
+
+
+def error(message, status):
+    return jsonify({'error': message}), status
+
+
+@bp_api.route('/books')
+@login_required
+@check_rights('show')
+def books():
+    etag = validators()
+    if not_modified(etag):
+        return with_validators(make_response('', 304), etag)
+    fields = read_fields()
+    limit = min(max(request.args.get('limit', DEFAULT_LIMIT, type=int), 1), MAX_LIMIT)
+    page = max(request.args.get('page', 1, type=int), 1)
+    after = parse_after(request.args.get('after'))
+    columns = [column for column in BOOK_COLUMNS if column in fields or column in ('id', 'year')]
+    try:
+        rows = get_books_page(page, after, per_page=limit, columns=columns, with_genres='genres' in fields)
+    except mysql.connector.errors.DatabaseError:
+        db.connection().rollback()
+        return error('database error', 500)
+    next_after = f'{rows[-1].year},{rows[-1].id}' if len(rows) == limit else None
+    response = jsonify({'books': [book_json(row, fields) for row in rows], 'next': next_after})
+    return with_validators(response, etag)
+
+
+@bp_api.route('/books/<int:book_id>')
+@login_required
+@check_rights('show')
+def book(book_id):
+    etag = validators()
+    if not_modified(etag):
+        return with_validators(make_response('', 304), etag)
+    fields = read_fields()
+    columns = ', '.join(f'b.{column}' for column in BOOK_COLUMNS if column in fields or column == 'id')
+    if 'genres' in fields:
+        columns += ', b.genre_names AS genres'
+    query = f'SELECT {columns} FROM books b WHERE b.id = %s'
+    try:
+        cursor = db.connection().cursor(named_tuple=True)
+        cursor.execute(query, (book_id,))
+        row = cursor.fetchone()
+        cursor.close()
+    except mysql.connector.errors.DatabaseError:
+        db.connection().rollback()
+        return error('database error', 500)
+    if row is None:
+        return error('not found', 404)
+    return with_validators(jsonify(book_json(row, fields)), etag)
@@ -1,8 +1,27 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, send_file
+from flask import Flask, render_template, request, redirect, url_for, flash, send_file, make_response, session, stream_with_context, abort, g
+from markupsafe import Markup
 from flask_login import login_required, current_user
 from mysql_db import MySQL
+from cache import Cache, TTLCache
+from images import ImagePipeline
+from importer import import_books
+from books import UPDATE_GENRE_NAMES
+from metrics import Metrics
+from jobs import JobQueue
+from migrate import Migrations
+from sweeper import OrphanSweeper
 import mysql.connector
 import math
+import csv
+import io
+import json
+import os
+import hashlib
+import shutil
+import tempfile
+import functools
+import click
+from collections import namedtuple
 
 app = Flask(__name__)
 
@@ -12,6 +31,18 @@ app.config.from_pyfile('config.py')
 
 db = MySQL(app)
 
+cache = Cache(app)
+
+metrics = Metrics(app, db)
+
+jobs = JobQueue(app, db, metrics)
+
+images = ImagePipeline(app, db, jobs, cache)
+
+migrations = Migrations(app, db)
+
+sweeper = OrphanSweeper(app, db, cache)
+
 from auth import bp_auth, check_rights, init_login_manager
 
 app.register_blueprint(bp_auth)
@@ -22,13 +53,25 @@ init_login_manager(app)
 
 PER_PAGE = 3
 
-def get_genres():
+COUNT_TTL = 60
+
+fragments_cache = TTLCache(ttl=app.config.get('FRAGMENT_CACHE_TTL', 300), maxsize=app.config.get('FRAGMENT_CACHE_SIZE', 1000))
+
+book_cache = TTLCache(ttl=app.config.get('BOOK_CACHE_TTL', 300), maxsize=app.config.get('BOOK_CACHE_SIZE', 10000))
+
+def load_genres():
     query = 'SELECT * FROM genres'
     cursor = db.connection().cursor(named_tuple=True)
     cursor.execute(query)
-    roles = cursor.fetchall()
+    genres = cursor.fetchall()
     cursor.close()
-    return roles
+    return genres
+
+def get_genres():
+    return cache.get_or_set('genres', load_genres)
+
+def get_genre_ids_by_name():
+    return cache.get_or_set('genres', lambda: {genre.name.strip().lower(): genre.id for genre in get_genres()}, key='by_name')
 
 def get_user():
     query = 'SELECT * FROM users'
@@ -38,7 +81,7 @@ def get_user():
     cursor.close()
     return user
 
-def get_roles():
+def load_roles():
     query = 'SELECT * FROM roles'
     cursor = db.connection().cursor(named_tuple=True)
     cursor.execute(query)
@@ -46,14 +89,89 @@ def get_roles():
     cursor.close()
     return roles
 
+def get_roles():
+    return cache.get_or_set('roles', load_roles)
+
+def loaded_books():
+    # Книги, уже прочитанные в этом запросе: повторный get_book не ходит в базу
+    if 'books' not in g:
+        g.books = {}
+    return g.books
+
 def get_book(book_id):
-    query = 'SELECT * FROM books WHERE id=%s'
-    cursor = db.connection().cursor(named_tuple=True)
-    cursor.execute(query, (book_id,))
-    book = cursor.fetchone()
-    cursor.close()
+    books = loaded_books()
+    if book_id not in books:
+        query = 'SELECT * FROM books WHERE id=%s'
+        cursor = db.connection().cursor(named_tuple=True)
+        cursor.execute(query, (book_id,))
+        books[book_id] = cursor.fetchone()
+        cursor.close()
+    return books[book_id]
+
+@functools.lru_cache(maxsize=None)
+def book_type(columns):
+    return namedtuple('Book', columns + ('genre_ids',))
+
+def get_books(ids):
+    books = loaded_books()
+    ids = [int(book_id) for book_id in ids]
+    missing = list({book_id for book_id in ids if book_id not in books or books[book_id] is not None and not hasattr(books[book_id], 'genre_ids')})
+    if missing:
+        placeholders = ', '.join(['%s'] * len(missing))
+        cursor = db.connection().cursor()
+        cursor.execute(f'SELECT book_id, genre_id FROM book_genres WHERE book_id IN ({placeholders})', missing)
+        genre_ids = {}
+        for book_id, genre_id in cursor.fetchall():
+            genre_ids.setdefault(book_id, set()).add(genre_id)
+        cursor.execute(f'SELECT * FROM books WHERE id IN ({placeholders})', missing)
+        Book = book_type(tuple(cursor.column_names))
+        id_index = Book._fields.index('id')
+        for row in cursor.fetchall():
+            books[row[id_index]] = Book(*row, frozenset(genre_ids.get(row[id_index], ())))
+        for book_id in missing:
+            books.setdefault(book_id, None)
+        cursor.close()
+    return [books[book_id] for book_id in ids if books[book_id] is not None]
+
+def get_cached_book(book_id):
+    # Запись хранится вместе с версией каталога. При общем CACHE_VERSION_BACKEND изменение книг в любом
+    # воркере делает её устаревшей через CACHE_VERSION_CHECK_INTERVAL; с local — только в этом воркере
+    version = cache.version('catalog')
+    item = book_cache.get(book_id)
+    if item is not None and item[0] == version:
+        return item[1]
+    book = get_book(book_id)
+    # Несуществующие id тоже запоминаем, но ненадолго
+    book_cache.set(book_id, (version, book), ttl=None if book else app.config.get('BOOK_CACHE_MISS_TTL', 30))
     return book
 
+def get_edit_book(book_id):
+    # Книга вместе с выбранными жанрами для формы редактирования, одним запросом
+    books = loaded_books()
+    if not hasattr(books.get(book_id), 'genre_ids'):
+        query = '''
+            SELECT b.*, CAST(GROUP_CONCAT(bg.genre_id) AS CHAR) AS genre_id_list
+            FROM books b
+            LEFT JOIN book_genres bg ON b.id = bg.book_id
+            WHERE b.id = %s
+            GROUP BY b.id
+        '''
+        cursor = db.connection().cursor()
+        cursor.execute(query, (book_id,))
+        row = cursor.fetchone()
+        Book = book_type(tuple(cursor.column_names[:-1]))
+        cursor.close()
+        if row is None:
+            books[book_id] = None
+            return None
+        genre_ids = frozenset(int(genre_id) for genre_id in row[-1].split(',')) if row[-1] else frozenset()
+        books[book_id] = Book(*row[:-1], genre_ids)
+    return books[book_id]
+
+def forget_book(book_id):
+    book_cache.pop(book_id)
+    loaded_books().pop(book_id, None)
+
 def get_genres_book(book_id):
     
     query = """
@@ -71,29 +189,157 @@ def get_genres_book(book_id):
     return genres
 
 
+def load_books_count():
+    cursor = db.connection().cursor()
+    cursor.execute('SELECT COUNT(*) FROM books')
+    count = cursor.fetchone()[0]
+    cursor.close()
+    return count
+
+def get_books_count():
+    # TTL страхует от изменений в обход приложения, которые не меняют версию каталога
+    return cache.get_or_set('catalog', load_books_count, key='count', ttl=COUNT_TTL)
+
+def bump_catalog():
+    cache.bump('catalog')
+
+def parse_after(value):
+    try:
+        year, book_id = value.split(',')
+        return int(year), int(book_id)
+    except (AttributeError, ValueError):
+        return None
+
+def get_books_page(page, after=None, per_page=PER_PAGE, columns=None, with_genres=True):
+    if after:
+        where = 'WHERE year < %s OR (year = %s AND id > %s)'
+        params = (after[0], after[0], after[1], per_page, 0)
+    else:
+        where = ''
+        params = (per_page, per_page * (page - 1))
+    columns = ', '.join(columns) if columns else '*'
+    if with_genres:
+        columns += ', genre_names AS genres'
+    query = f'''
+            SELECT {columns} FROM books
+            {where}
+            ORDER BY year DESC, id
+            LIMIT %s OFFSET %s
+    '''
+    cursor = db.connection().cursor(named_tuple=True)
+    cursor.execute(query, params)
+    books = cursor.fetchall()
+    cursor.close()
+    return books
+
+def set_book_genres(cursor, book_id, genre_ids, current=frozenset()):
+    genre_ids = {int(genre_id) for genre_id in genre_ids}
+    removed = current - genre_ids
+    added = genre_ids - current
+    if removed:
+        placeholders = ', '.join(['%s'] * len(removed))
+        query = f'DELETE FROM book_genres WHERE book_id = %s AND genre_id IN ({placeholders})'
+        cursor.execute(query, (book_id, *removed))
+    if added:
+        values = ', '.join(['(%s, %s)'] * len(added))
+        query = f'INSERT INTO book_genres (book_id, genre_id) VALUES {values}'
+        cursor.execute(query, [value for genre_id in added for value in (book_id, genre_id)])
+    if removed or added:
+        cursor.execute(f'{UPDATE_GENRE_NAMES} WHERE id = %s', (book_id,))
+
+def save_cover():
+    file = request.files.get('cover')
+    if not file or not file.filename:
+        return None
+    return images.save_upload(file)
+
+
+@app.cli.command('cache-bump')
+@click.argument('namespace')
+def cache_bump(namespace):
+    cache.bump(namespace)
+    click.echo(f'Кэш {namespace} сброшен')
+
+
+@app.cli.command('rebuild-genre-names')
+@click.option('--batch-size', default=5000, type=int)
+def rebuild_genre_names(batch_size):
+    cursor = db.connection().cursor()
+    cursor.execute('SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), 0) FROM books')
+    first_id, last_id = cursor.fetchone()
+    changed = 0
+    for start in range(first_id, last_id + 1, batch_size):
+        cursor.execute(f'{UPDATE_GENRE_NAMES} WHERE id BETWEEN %s AND %s', (start, start + batch_size - 1))
+        changed += cursor.rowcount
+        db.connection().commit()
+    cursor.close()
+    bump_catalog()
+    click.echo(f'Список жанров исправлен у книг: {changed}')
+
+
+def render_book_list(page, after):
+    books = get_books_page(page, after)
+    count = math.ceil(get_books_count() / PER_PAGE)
+    next_after = None
+    if len(books) == PER_PAGE:
+        next_after = f'{books[-1].year},{books[-1].id}'
+    return render_template('books/list.html', books=books, count=count, page=page, next_after=next_after)
+
+
+def import_format(filename, default='csv'):
+    ext = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    return ext if ext in ('csv', 'jsonl') else default
+
+
+@app.cli.command('import-books')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default=None)
+@click.option('--chunk-size', default=lambda: app.config.get('IMPORT_CHUNK_SIZE', 1000), type=int)
+def import_books_command(path, fmt, chunk_size):
+    def progress(report):
+        click.echo(f'{report.rows} строк, добавлено {report.imported}, ошибок {len(report.errors)}, '
+                   f'{report.rows_per_second:.0f} строк/с', err=True)
+
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        report = import_books(db.connection(), stream, fmt or import_format(path), get_genre_ids_by_name(),
+                              chunk_size=chunk_size, progress=progress)
+    bump_catalog()
+    for line_num, message in report.errors:
+        click.echo(f'строка {line_num}: {message}', err=True)
+    click.echo(f'Добавлено книг: {report.imported} из {report.rows} за {report.elapsed:.1f} с')
+
+
 @app.route('/')
 def index():
-    books=[]
-    query = '''
-        SELECT b.*, GROUP_CONCAT(g.name SEPARATOR ', ') AS genres
-        FROM books b
-        LEFT JOIN book_genres bg ON b.id = bg.book_id
-        LEFT JOIN genres g ON bg.genre_id = g.id
-        GROUP BY b.id
-        ORDER BY b.year DESC;
-    '''
-    page = int(request.args.get('page', 1))
-    count = 0
-    try:
-        cursor = db.connection().cursor(named_tuple=True)
-        cursor.execute(query)
-        books = cursor.fetchall()
-        cursor.close()
-        count = math.ceil(len(books) / PER_PAGE)
-    except mysql.connector.errors.DatabaseError:
-        db.connection().rollback()
-        flash('Произошла ошибка при загрузке страницы!', 'danger')
-    return render_template('index.html', books=books[PER_PAGE * (page - 1) : PER_PAGE * page], count=count, page=page)
+    page = max(int(request.args.get('page', 1)), 1)
+    after = parse_after(request.args.get('after'))
+    anonymous = not current_user.is_authenticated
+    permissions = frozenset() if anonymous else current_user.permissions
+    key = (cache.version('catalog'), cache.version('covers'), page, after, tuple(sorted(permissions)))
+    etag = None
+    # ETag строится из версии каталога: с версиями в памяти процесса воркеры не узнают о чужих изменениях
+    if anonymous and cache.shared and '_flashes' not in session:
+        etag = hashlib.md5(repr(key).encode()).hexdigest()
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
+    book_list = fragments_cache.get(key)
+    if book_list is None:
+        try:
+            book_list = render_book_list(page, after)
+            fragments_cache.set(key, book_list)
+        except mysql.connector.errors.DatabaseError:
+            db.connection().rollback()
+            flash('Произошла ошибка при загрузке страницы!', 'danger')
+            book_list = ''
+            etag = None
+    response = make_response(render_template('index.html', book_list=Markup(book_list)))
+    response.vary.add('Cookie')
+    if etag:
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+    return response
 
 @app.route('/books/create', methods = ['POST', 'GET'])
 @login_required
@@ -107,55 +353,140 @@ def create():
         author = request.form['author']
         pages = request.form['pages']
         genres = request.form.getlist('genres')
+        if not genres:
+            flash('Выберите жанр', 'warning')
+            return render_template('books/create.html', genres = get_genres())
+        try:
+            cover = save_cover()
+        except ValueError:
+            flash('Обложка должна быть изображением PNG, JPEG, WebP или GIF', 'warning')
+            return render_template('books/create.html', genres = get_genres())
         try:
             querry = '''
-                insert into books (name, description, year, publishing, author, pages)
-                VALUES (%s, %s, %s, %s, %s, %s)
+                insert into books (name, description, year, publishing, author, pages, cover)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
                 '''
             cursor = db.connection().cursor(named_tuple=True)
-            cursor.execute(querry, (name, description, year, publishing, author, pages))
+            cursor.execute(querry, (name, description, year, publishing, author, pages, cover))
+            set_book_genres(cursor, cursor.lastrowid, genres)
             db.connection().commit()
-            if not genres:
-                flash('Выберите жанр', 'warning')
-                return render_template('books/edit.html', genres = get_genres())
             cursor.close()
-            cursor = db.connection().cursor(named_tuple=True)
-
-            querry = '''
-                SELECT id FROM books where name=%s and description=%s
-                '''
-            cursor.execute(querry, (name, description, ))
-            book_id = cursor.fetchone()
-            for genre_id in genres:
-                query = "INSERT INTO book_genres (book_id, genre_id) VALUES (%s, %s)"
-                cursor.execute(query, (book_id[0], genre_id,))
-                db.connection().commit()
-            
+            bump_catalog()
             flash(f'Книга {name} успешно добавлена.', 'success')
-            cursor.close()
         except mysql.connector.errors.DatabaseError:
             db.connection().rollback()
             flash(f'При добавлении книги произошла ошибка.', 'danger')
-            return render_template('books/create.html')
+            return render_template('books/create.html', genres = get_genres())
 
     return render_template('books/create.html', genres = get_genres())
 
 
+@app.route('/books/import', methods = ['POST', 'GET'])
+@login_required
+@check_rights('create')
+def import_view():
+    report = None
+    if request.method == 'POST':
+        file = request.files.get('file')
+        if not file or not file.filename:
+            flash('Выберите файл', 'warning')
+            return render_template('books/import.html')
+        # SpooledTemporaryFile из Werkzeug на Python 3.10 нельзя обернуть в TextIOWrapper:
+        # копируем загрузку в обычный временный файл
+        with tempfile.TemporaryFile() as upload:
+            try:
+                shutil.copyfileobj(file.stream, upload)
+                upload.seek(0)
+                stream = io.TextIOWrapper(upload, encoding='utf-8-sig', newline='')
+                report = import_books(db.connection(), stream, import_format(file.filename, request.form.get('format')),
+                                      get_genre_ids_by_name(), chunk_size=app.config.get('IMPORT_CHUNK_SIZE', 1000))
+            except (ValueError, UnicodeDecodeError, csv.Error, OSError) as err:
+                flash(f'Не удалось прочитать файл: {err}', 'danger')
+                return render_template('books/import.html')
+            except mysql.connector.errors.Error:
+                db.connection().rollback()
+                flash('При импорте произошла ошибка базы данных.', 'danger')
+                return render_template('books/import.html')
+            finally:
+                bump_catalog()
+        flash(f'Добавлено книг: {report.imported} из {report.rows}.', 'success' if not report.errors else 'warning')
+    return render_template('books/import.html', report=report)
+
+
+EXPORT_QUERY = '''
+    SELECT b.id, b.name, b.description, b.year, b.publishing, b.author, b.pages,
+        REPLACE(b.genre_names, ', ', ';') AS genres
+    FROM books b
+    ORDER BY b.id
+'''
+EXPORT_COLUMNS = ('id', 'name', 'description', 'year', 'publishing', 'author', 'pages', 'genres')
+
+def export_rows(format_chunk):
+    chunk_size = app.config.get('EXPORT_CHUNK_SIZE', 1000)
+    cursor = db.connection().cursor()
+    finished = False
+    try:
+        cursor.execute(EXPORT_QUERY)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield format_chunk(rows)
+        finished = True
+    finally:
+        if finished:
+            cursor.close()
+        else:
+            # дочитывать оставшиеся строки ради закрытия курсора дольше, чем переподключиться
+            db.discard_connection()
+
+def csv_chunk(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+def jsonl_chunk(rows):
+    return ''.join(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + '\n' for row in rows)
+
+
+@app.route('/books/export.csv')
+@login_required
+@check_rights('show')
+def export_csv():
+    def generate():
+        yield csv_chunk([EXPORT_COLUMNS])
+        yield from export_rows(csv_chunk)
+    response = app.response_class(stream_with_context(generate()), mimetype='text/csv')
+    response.headers['Content-Disposition'] = 'attachment; filename=books.csv'
+    return response
+
+
+@app.route('/books/export.jsonl')
+@login_required
+@check_rights('show')
+def export_jsonl():
+    response = app.response_class(stream_with_context(export_rows(jsonl_chunk)), mimetype='application/x-ndjson')
+    response.headers['Content-Disposition'] = 'attachment; filename=books.jsonl'
+    return response
+
+
 @app.route('/books/show/<int:book_id>')
 @login_required
 @check_rights('show')
 def show(book_id):
-    querry = 'SELECT * FROM books WHERE books.id=%s'
-    cursor = db.connection().cursor(named_tuple=True)
-    cursor.execute(querry, (book_id,))
-    book = cursor.fetchone()
-    cursor.close()
-    return render_template('books/show.html', book = book, genres = get_genres_book(book_id))
+    book = get_cached_book(book_id)
+    if book is None:
+        abort(404)
+    genres = book.genre_names.split(', ') if book.genre_names else []
+    return render_template('books/show.html', book = book, genres = genres)
 
 @app.route('/books/edit/<int:book_id>', methods=["POST", "GET"])
 @login_required
 @check_rights('edit')
 def edit(book_id):
+    book = get_edit_book(book_id)
+    if book is None:
+        abort(404)
     if request.method == 'POST':
         name = request.form['name']
         description = request.form['description']
@@ -164,66 +495,71 @@ def edit(book_id):
         author = request.form['author']
         pages = request.form['pages']
         genres = request.form.getlist('genres')
-        
+        try:
+            cover = save_cover()
+        except ValueError:
+            flash('Обложка должна быть изображением PNG, JPEG, WebP или GIF', 'warning')
+            return render_template('books/edit.html', book = book, genres = get_genres())
+
         try:
             query = '''
-            UPDATE books set name = %s, description = %s, year = %s, publishing = %s, author = %s, pages = %s where id = %s
+            UPDATE books set name = %s, description = %s, year = %s, publishing = %s, author = %s, pages = %s, cover = COALESCE(%s, cover) where id = %s
             '''
             cursor = db.connection().cursor(named_tuple=True)
-            cursor.execute(query, (name, description, year, publishing, author, pages, book_id,))
+            cursor.execute(query, (name, description, year, publishing, author, pages, cover, book_id,))
+            if genres:
+                # Сравниваем с жанрами, прочитанными вместе с книгой: без изменений book_genres не трогаем
+                set_book_genres(cursor, book_id, genres, book.genre_ids)
             db.connection().commit()
+            forget_book(book_id)
+            bump_catalog()
             if not genres:
                 flash('Выберите жанр', 'warning')
-                return render_template('books/edit.html', book = get_book(book_id), genres = get_genres())
-            
-            query = "DELETE FROM book_genres WHERE book_id = %s"
-            cursor.execute(query, (book_id,))
-            db.connection().commit()
-
-            for genre_id in genres:
-                query = "INSERT INTO book_genres (book_id, genre_id) VALUES (%s, %s)"
-                cursor.execute(query, (book_id, genre_id,))
-                db.connection().commit()
+                return render_template('books/edit.html', book = get_edit_book(book_id), genres = get_genres())
 
             flash(f'Книга {name} успешно отредактирована.', 'success')
             cursor.close()
-            return render_template('books/edit.html', book=get_book(book_id), genres=get_genres())
+            return render_template('books/edit.html', book=get_edit_book(book_id), genres=get_genres())
 
         except mysql.connector.errors.DatabaseError as err:
             db.connection().rollback()
             flash(f'При редактировании книги произошла ошибка.{err}', 'danger')
             
-            return render_template('books/edit.html', book = get_book(book_id), genres = get_genres())
+            return render_template('books/edit.html', book = book, genres = get_genres())
         
-    return render_template('books/edit.html', book = get_book(book_id), genres = get_genres())
-
-
-@app.route('/books/delete/')  
-@login_required  
-@check_rights('delete')  
-def delete():
-    genres = request.form.getlist('genres')
-    page = int(request.args.get('page', 1))
-    count = 0
-    try:  
-        book_id = request.args.get('book_id')
-        querry = "DELETE FROM books WHERE id = %s"
-        cursor = db.connection().cursor(named_tuple=True)  
-        cursor.execute(querry, (book_id,))  
-        db.connection().commit()
+    return render_template('books/edit.html', book = book, genres = get_genres())
 
-        for genre_id in genres:
-            query = "DELETE FROM book_genres WHERE book_id = %s AND genre_id = %s"
-            cursor.execute(query, (book_id, genre_id,))
-            db.connection().commit()
 
-        db.connection().commit()  
-        flash(f'Книга успешно удалена.', 'success')  
+@app.route('/books/delete/<int:book_id>', methods=['POST'])
+@login_required
+@check_rights('delete')
+def delete(book_id):
+    page = request.form.get('page', 1, type=int)
+    try:
+        cursor = db.connection().cursor()
+        # Связи удаляются в той же транзакции, что и книга, даже если в базе нет внешнего ключа с каскадом
+        cursor.execute('DELETE FROM book_genres WHERE book_id = %s', (book_id,))
+        cursor.execute('DELETE FROM books WHERE id = %s', (book_id,))
+        deleted = cursor.rowcount
+        db.connection().commit()
         cursor.close()
+    except mysql.connector.errors.DatabaseError:
+        db.connection().rollback()
+        flash('При удалении книги произошла ошибка.', 'danger')
+        return redirect(url_for('index', page=page))
+    forget_book(book_id)
+    bump_catalog()
+    if deleted:
+        flash('Книга успешно удалена.', 'success')
+    else:
+        flash('Книга уже удалена.', 'warning')
+    return redirect(url_for('index', page=page))
+
+
+from search import bp_search
+
+app.register_blueprint(bp_search)
+
+from api import bp_api
 
-    except mysql.connector.errors.DatabaseError:  
-        db.connection().rollback()  
-        flash(f'При удалении книги произошла ошибка.', 'danger')  
-        return render_template('index.html', book=get_book(book_id), genres=get_genres(), page=page, count=count)
-  
-    return redirect(url_for('index'))
+app.register_blueprint(bp_api)
@@ -1,15 +1,18 @@
 from flask import render_template, request, redirect, url_for, flash, Blueprint
 from werkzeug.security import check_password_hash, generate_password_hash
 from flask_login import LoginManager, UserMixin, login_user, logout_user, current_user, login_required
-from app import db
-from check_user import CheckUser
+from app import db, cache
+from cache import TTLCache
 from functools import wraps
+import click
 
 bp_auth = Blueprint('auth', __name__, url_prefix='/auth')
 
 ADMIN_ROLE_ID = 1
 MODER_ROLE_ID = 2
 
+user_cache = TTLCache(ttl=300, maxsize=10000)
+
 def init_login_manager(app):
     login_manager = LoginManager()
     login_manager.init_app(app)
@@ -17,6 +20,8 @@ def init_login_manager(app):
     login_manager.login_message = 'Для доступа необходимо пройти аутентификацию'
     login_manager.login_message_category = 'warning'
     login_manager.user_loader(load_user)
+    user_cache.ttl = app.config.get('USER_CACHE_TTL', 300)
+    user_cache.maxsize = app.config.get('USER_CACHE_SIZE', 10000)
     login_manager.init_app(app)
 
 
@@ -24,11 +29,7 @@ def check_rights(action):
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            user = None
-            if kwargs.get('user_id'):
-                user_id = kwargs['user_id']
-                user = load_user(user_id)
-            if current_user.can(action, user):
+            if current_user.can(action):
                 return func(*args, **kwargs)
             else:
                 flash("У Вас недостаточно прав для выполнения данного действия.", "danger")
@@ -38,23 +39,21 @@ def check_rights(action):
 
 
 class User(UserMixin):
-    def __init__(self, user_id, user_login, role_id, last_name, first_name, middle_name=None):
+    def __init__(self, user_id, user_login, role_id, last_name, first_name, middle_name=None, permissions=frozenset()):
         self.id = user_id
         self.login = user_login
         self.role_id = role_id
         self.last_name = last_name
         self.first_name = first_name
         self.middle_name = middle_name
+        self.permissions = permissions
     def is_admin(self):
         return self.role_id == ADMIN_ROLE_ID
     def is_moderator(self):
         return self.role_id == MODER_ROLE_ID   
-    def can(self, action, record = None):
-        check_user = CheckUser(record)
-        method = getattr(check_user, action, None)
-        if method:
-            return method()
-        return False
+    def can(self, action):
+        # Права роли задаются таблицей role_permissions
+        return action in self.permissions
     
     @property
     def fio(self):
@@ -62,16 +61,53 @@ class User(UserMixin):
 
 
 def load_user(user_id):
+    # Версия users общая для процессов: set-role из командной строки сбрасывает кэш во всех воркерах.
+    # Её берём до чтения записи, чтобы изменение между ними не осталось в кэше
+    version = cache.version('users')
+    item = user_cache.get(str(user_id))
+    if item is not None and item[0] == version:
+        user = item[1]
+        user.permissions = role_permissions(user.role_id)
+        return user
     query = 'SELECT * FROM users WHERE users.id=%s'
     cursor = db.connection().cursor(named_tuple=True)
     cursor.execute(query, (user_id,))
-    user = cursor.fetchone()
+    record = cursor.fetchone()
     cursor.close()
-    if user:
-        return User(user.id, user.login, user.role_id, user.last_name, user.first_name, user.middle_name)
+    if record:
+        return cache_user(record, version)
     return None
 
 
+def load_rights_matrix():
+    # Права ролей хранятся в role_permissions (миграция 0006_role_permissions)
+    cursor = db.connection().cursor()
+    cursor.execute('SELECT role_id, action FROM role_permissions')
+    matrix = {}
+    for role_id, action in cursor.fetchall():
+        matrix.setdefault(role_id, set()).add(action)
+    cursor.close()
+    return {role_id: frozenset(actions) for role_id, actions in matrix.items()}
+
+
+def role_permissions(role_id):
+    return cache.get_or_set('roles', load_rights_matrix, key='rights').get(role_id, frozenset())
+
+
+def cache_user(record, version=None):
+    if version is None:
+        version = cache.version('users')
+    user = User(record.id, record.login, record.role_id, record.last_name, record.first_name, record.middle_name,
+                permissions=role_permissions(record.role_id))
+    user_cache.set(str(user.id), (version, user))
+    return user
+
+
+def invalidate_user(user_id):
+    user_cache.pop(str(user_id))
+    cache.bump('users')
+
+
 @bp_auth.route('/login', methods = ['POST', 'GET'])
 def login():
     if request.method == 'POST':
@@ -79,12 +115,13 @@ def login():
         password = request.form['password']
         check = request.form.get('secretcheck') == 'on'
         query = 'SELECT * FROM users WHERE users.login=%s AND users.password_hash=SHA2(%s,256)'
+        version = cache.version('users')
         cursor = db.connection().cursor(named_tuple=True)
         cursor.execute(query, (login, password))
         user = cursor.fetchone()
         cursor.close()
         if user:
-            login_user(User(user.id, user.login, user.role_id, user.last_name, user.first_name, user.middle_name), remember=check)
+            login_user(cache_user(user, version), remember=check)
             param_url = request.args.get('next')
             flash('Вы успешно вошли!', 'success')
             return redirect(param_url or url_for('index'))
@@ -95,4 +132,20 @@ def login():
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('index'))
\ No newline at end of file
+    return redirect(url_for('index'))
+
+@bp_auth.cli.command('set-role')
+@click.argument('login')
+@click.argument('role_id', type=int)
+def set_role(login, role_id):
+    cursor = db.connection().cursor(named_tuple=True)
+    cursor.execute('SELECT id FROM users WHERE login=%s', (login,))
+    user = cursor.fetchone()
+    if user is None:
+        cursor.close()
+        raise click.ClickException(f'Пользователь {login} не найден')
+    cursor.execute('UPDATE users SET role_id=%s WHERE id=%s', (role_id, user.id))
+    db.connection().commit()
+    cursor.close()
+    invalidate_user(user.id)
+    click.echo(f'Роль пользователя {login} изменена на {role_id}')
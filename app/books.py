@@ -0,0 +1,9 @@
+# books.genre_names повторяет связи из book_genres, чтобы список книг читался из одной таблицы.
+# Запрос общий для приложения, импорта, миграции 0005_books_genre_names и bench/seed.py
+UPDATE_GENRE_NAMES = '''
+    UPDATE books SET genre_names = (
+        SELECT COALESCE(GROUP_CONCAT(g.name ORDER BY g.name SEPARATOR ', '), '')
+        FROM book_genres bg JOIN genres g ON bg.genre_id = g.id
+        WHERE bg.book_id = books.id
+    )
+'''
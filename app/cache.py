@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    def __init__(self, ttl, maxsize=None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires = item
+            if expires <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return item[0] if item else None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocalVersionStore:
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, namespace):
+        with self._lock:
+            return self._versions.setdefault(namespace, time.time_ns())
+
+    def bump(self, namespace):
+        with self._lock:
+            version = self._versions[namespace] = time.time_ns()
+        return version
+
+
+class FileVersionStore:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def get(self, namespace):
+        try:
+            with open(os.path.join(self.path, namespace)) as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return self.bump(namespace)
+
+    def bump(self, namespace):
+        version = time.time_ns()
+        target = os.path.join(self.path, namespace)
+        tmp = f'{target}.{os.getpid()}.{threading.get_ident()}'
+        with open(tmp, 'w') as f:
+            f.write(str(version))
+        os.replace(tmp, target)
+        return version
+
+
+class RedisVersionStore:
+    def __init__(self, url, prefix='cache-version:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, namespace):
+        key = self.prefix + namespace
+        version = self.client.get(key)
+        if version is None:
+            self.client.set(key, time.time_ns(), nx=True)
+            version = self.client.get(key)
+        return int(version)
+
+    def bump(self, namespace):
+        version = time.time_ns()
+        self.client.set(self.prefix + namespace, version)
+        return version
+
+
+def make_version_store(backend):
+    if backend.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisVersionStore(backend)
+    if backend.startswith('file://'):
+        return FileVersionStore(backend[len('file://'):])
+    if backend == 'local':
+        return LocalVersionStore()
+    raise ValueError(f'Unknown cache version backend: {backend}')
+
+
+class Cache:
+    def __init__(self, app):
+        self.app = app
+        # По умолчанию версии лежат в каталоге instance: их видят все воркеры и команды flask;
+        # local подходит только для одного процесса
+        backend = app.config.get('CACHE_VERSION_BACKEND') or 'file://' + os.path.join(app.instance_path, 'versions')
+        self.store = make_version_store(backend)
+        self.shared = not isinstance(self.store, LocalVersionStore)
+        self.check_interval = app.config.get('CACHE_VERSION_CHECK_INTERVAL', 1)
+        self._versions = {}
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def version(self, namespace):
+        now = time.monotonic()
+        known = self._versions.get(namespace)
+        if known is not None and now - known[1] < self.check_interval:
+            return known[0]
+        version = self.store.get(namespace)
+        self._versions[namespace] = (version, now)
+        return version
+
+    def get_or_set(self, namespace, loader, key=None, ttl=None):
+        version = self.version(namespace)
+        now = time.monotonic()
+        item = self._values.get((namespace, key))
+        if item is not None and item[0] == version and (item[2] is None or item[2] > now):
+            return item[1]
+        value = loader()
+        with self._lock:
+            self._values[(namespace, key)] = (version, value, None if ttl is None else now + ttl)
+        return value
+
+    def bump(self, namespace):
+        version = self.store.bump(namespace)
+        self._versions[namespace] = (version, time.monotonic())
+        return version
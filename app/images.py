@@ -0,0 +1,222 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from flask import send_from_directory, url_for
+
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+
+SIZES = (230, 360, 460, 720)
+UPLOAD_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.gif')
+UPLOAD_FORMATS = {'PNG': '.png', 'JPEG': '.jpg', 'WEBP': '.webp', 'GIF': '.gif'}
+SIGNATURES = (b'\x89PNG\r\n\x1a\n', b'\xff\xd8\xff', b'GIF87a', b'GIF89a')
+CHUNK_SIZE = 64 * 1024
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'png': 'image/png'}
+MAX_AGE = 365 * 24 * 60 * 60
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+
+def image_formats():
+    if Image is None:
+        return ()
+    return tuple(fmt for fmt in ('avif', 'webp') if features.check(fmt)) + ('png',)
+
+
+def check_image(path):
+    # Возвращает расширение по настоящему формату файла, а не по имени
+    if Image is None:
+        with open(path, 'rb') as f:
+            head = f.read(12)
+        if not head.startswith(SIGNATURES) and not (head[:4] == b'RIFF' and head[8:12] == b'WEBP'):
+            raise ValueError('Cover is not an image')
+        return None
+    try:
+        with Image.open(path) as image:
+            fmt = image.format
+            image.verify()
+    except (OSError, SyntaxError, Image.DecompressionBombError) as err:
+        raise ValueError(f'Cover is not an image: {err}') from err
+    if fmt not in UPLOAD_FORMATS:
+        raise ValueError(f'Unsupported cover format: {fmt}')
+    return UPLOAD_FORMATS[fmt]
+
+
+def variant_name(digest, size, fmt):
+    return f'{digest}-{size}.{fmt}'
+
+
+def render_variants(source, output, digest, sizes=SIZES):
+    formats = image_formats()
+    targets = [os.path.join(output, variant_name(digest, size, fmt)) for size in sizes for fmt in formats]
+    if all(os.path.exists(target) for target in targets):
+        return
+    with Image.open(source) as original:
+        image = original.convert('RGBA')
+    for size in sizes:
+        thumb = image.copy()
+        thumb.thumbnail((size, size), Image.LANCZOS)
+        for fmt in formats:
+            target = os.path.join(output, variant_name(digest, size, fmt))
+            if os.path.exists(target):
+                continue
+            tmp = f'{target}.{os.getpid()}.tmp'
+            if fmt == 'png':
+                thumb.save(tmp, 'PNG', optimize=True)
+            else:
+                thumb.save(tmp, fmt.upper(), quality=80)
+            os.replace(tmp, target)
+
+
+class ImagePipeline:
+    def __init__(self, app, db, jobs, cache=None):
+        self.app = app
+        self.db = db
+        self.jobs = jobs
+        self.cache = cache
+        self.output = app.config.get('IMAGE_CACHE_DIR', os.path.join(app.instance_path, 'images'))
+        self.originals = os.path.join(self.output, 'originals')
+        self.placeholder = os.path.join(app.static_folder, 'img', 'book.png')
+        self.formats = image_formats()
+        self._placeholder_digest = None
+        self._ready = set()
+        self._pending = set()
+        self._failed = set()
+        self._lock = threading.Lock()
+        jobs.register('render_cover', render_variants, cpu=True, on_success=self._rendered, on_failure=self._render_failed)
+        app.add_url_rule('/img/<path:filename>', 'image', self.serve)
+        app.jinja_env.globals.update(cover=self.cover)
+
+    def add_original(self, path):
+        digest = file_digest(path)
+        ext = os.path.splitext(path)[1].lower()
+        os.makedirs(self.originals, exist_ok=True)
+        target = os.path.join(self.originals, digest + ext)
+        if not os.path.exists(target):
+            shutil.copyfile(path, target)
+        render_variants(target, self.output, digest)
+        return digest, digest + ext
+
+    def placeholder_digest(self):
+        if self._placeholder_digest is None:
+            with self._lock:
+                if self._placeholder_digest is None:
+                    self._placeholder_digest = self.add_original(self.placeholder)
+        return self._placeholder_digest
+
+    def save_upload(self, file):
+        ext = os.path.splitext(file.filename)[1].lower()
+        if ext not in UPLOAD_EXTENSIONS:
+            raise ValueError(f'Unsupported cover type: {ext}')
+        os.makedirs(self.originals, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=self.originals, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    out.write(chunk)
+            ext = check_image(tmp) or ext
+            original = digest.hexdigest()[:32] + ext
+            target = os.path.join(self.originals, original)
+            created = not os.path.exists(target)
+            if created:
+                os.replace(tmp, target)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        if created:
+            # Книга не сохранилась: новый файл никому не нужен
+            self.db.on_rollback(lambda: self.discard_original(original))
+        # Копии готовятся, только если книга с обложкой сохранилась
+        self.jobs.after_commit(lambda: self.schedule(original))
+        return original
+
+    def discard_original(self, original):
+        # Тот же файл мог загрузить и сохранить другой запрос; если его книга ещё не сохранена,
+        # она покажет стандартную обложку
+        cursor = self.db.connection().cursor()
+        cursor.execute('SELECT 1 FROM books WHERE cover = %s LIMIT 1', (original,))
+        used = cursor.fetchone() is not None
+        cursor.close()
+        if not used:
+            try:
+                os.remove(os.path.join(self.originals, original))
+            except FileNotFoundError:
+                pass
+
+    def schedule(self, original):
+        with self._lock:
+            if original in self._pending or original in self._failed or self.is_ready(original):
+                return
+            self._pending.add(original)
+        digest = os.path.splitext(original)[0]
+        try:
+            self.jobs.enqueue('render_cover', os.path.join(self.originals, original), self.output, digest)
+        except Exception:
+            with self._lock:
+                self._pending.discard(original)
+            raise
+
+    def _rendered(self, source, output, digest, sizes=None):
+        original = os.path.basename(source)
+        with self._lock:
+            self._pending.discard(original)
+            self._ready.add(original)
+        if self.cache is not None:
+            self.cache.bump('covers')
+
+    def _render_failed(self, source, output, digest, sizes=None):
+        original = os.path.basename(source)
+        with self._lock:
+            self._pending.discard(original)
+            self._failed.add(original)
+        self.app.logger.warning('Cover %s was not rendered', original)
+
+    def is_ready(self, original):
+        if original in self._ready:
+            return True
+        if self.formats:
+            digest = os.path.splitext(original)[0]
+            path = os.path.join(self.output, variant_name(digest, SIZES[-1], self.formats[-1]))
+        else:
+            path = os.path.join(self.originals, original)
+        if os.path.exists(path):
+            self._ready.add(original)
+            return True
+        return False
+
+    def url(self, filename):
+        return url_for('image', filename=filename)
+
+    def cover(self, size, original=None):
+        if original and self.is_ready(original):
+            digest = os.path.splitext(original)[0]
+        else:
+            if original and os.path.exists(os.path.join(self.originals, original)):
+                self.schedule(original)
+            digest, original = self.placeholder_digest()
+        if not self.formats:
+            return {'sources': [], 'src': self.url('originals/' + original)}
+        sources = []
+        for fmt in self.formats:
+            srcset = ', '.join(f'{self.url(variant_name(digest, size * scale, fmt))} {scale}x'
+                               for scale in (1, 2) if size * scale in SIZES)
+            sources.append({'type': MIME_TYPES[fmt], 'srcset': srcset})
+        return {'sources': sources, 'src': self.url(variant_name(digest, size, 'png'))}
+
+    def serve(self, filename):
+        response = send_from_directory(self.output, filename, max_age=MAX_AGE)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
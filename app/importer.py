@@ -0,0 +1,147 @@
+import csv
+import json
+import time
+import mysql.connector
+from books import UPDATE_GENRE_NAMES
+
+FIELDS = ('name', 'description', 'year', 'publishing', 'author', 'pages')
+INSERT_BOOK = '''
+    INSERT INTO books (name, description, year, publishing, author, pages)
+    VALUES (%s, %s, %s, %s, %s, %s)
+'''
+INSERT_LINK = 'INSERT INTO book_genres (book_id, genre_id) VALUES (%s, %s)'
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.errors = []
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0
+
+
+def read_rows(stream, fmt):
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_num, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as err:
+                row = err
+            yield line_num, row
+    else:
+        raise ValueError(f'Unknown import format: {fmt}')
+
+
+def parse_row(row, genre_ids):
+    if not isinstance(row, dict):
+        raise ValueError(f'некорректная строка: {row}')
+    values = []
+    for field in FIELDS:
+        value = row.get(field)
+        if value is None or str(value).strip() == '':
+            raise ValueError(f'не заполнено поле {field}')
+        if field in ('year', 'pages'):
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise ValueError(f'поле {field} должно быть числом')
+        values.append(value)
+    names = row.get('genres') or []
+    if isinstance(names, str):
+        names = names.split(';')
+    genres = []
+    for name in names:
+        name = str(name).strip()
+        if not name:
+            continue
+        genre_id = genre_ids.get(name.lower())
+        if genre_id is None:
+            raise ValueError(f'неизвестный жанр {name}')
+        genres.append(genre_id)
+    if not genres:
+        raise ValueError('не указан жанр')
+    return tuple(values), sorted(set(genres))
+
+
+def ids_are_consecutive(connection):
+    # Многострочный INSERT с известным числом строк получает идущие подряд id при любом
+    # innodb_autoinc_lock_mode, но только если шаг автоинкремента равен 1 (в Galera и
+    # групповой репликации он обычно больше)
+    cursor = connection.cursor()
+    cursor.execute('SELECT @@auto_increment_increment')
+    increment = cursor.fetchone()[0]
+    cursor.close()
+    return increment == 1
+
+
+def write_chunk(connection, chunk, report, consecutive_ids=True):
+    cursor = connection.cursor()
+    try:
+        if consecutive_ids:
+            try:
+                cursor.executemany(INSERT_BOOK, [values for _, values, _ in chunk])
+                # executemany отправляет один многострочный INSERT, а InnoDB выдаёт
+                # такому запросу идущие подряд id, начиная с lastrowid
+                if cursor.rowcount == len(chunk):
+                    first_id = cursor.lastrowid
+                    links = [(first_id + i, genre_id) for i, (_, _, genres) in enumerate(chunk) for genre_id in genres]
+                    cursor.executemany(INSERT_LINK, links)
+                    cursor.execute(f'{UPDATE_GENRE_NAMES} WHERE id BETWEEN %s AND %s', (first_id, first_id + len(chunk) - 1))
+                    connection.commit()
+                    report.imported += len(chunk)
+                    return
+            except mysql.connector.errors.DatabaseError:
+                pass
+            connection.rollback()
+        # По одной книге: id каждой берётся из её собственного INSERT
+        for line_num, values, genres in chunk:
+            try:
+                cursor.execute(INSERT_BOOK, values)
+                book_id = cursor.lastrowid
+                cursor.executemany(INSERT_LINK, [(book_id, genre_id) for genre_id in genres])
+                cursor.execute(f'{UPDATE_GENRE_NAMES} WHERE id = %s', (book_id,))
+                connection.commit()
+                report.imported += 1
+            except mysql.connector.errors.DatabaseError as err:
+                connection.rollback()
+                report.errors.append((line_num, str(err)))
+    finally:
+        cursor.close()
+
+
+def import_books(connection, stream, fmt, genre_ids, chunk_size=1000, progress=None):
+    report = ImportReport()
+    consecutive_ids = ids_are_consecutive(connection)
+    chunk = []
+    for line_num, row in read_rows(stream, fmt):
+        report.rows += 1
+        try:
+            values, genres = parse_row(row, genre_ids)
+        except ValueError as err:
+            report.errors.append((line_num, str(err)))
+            continue
+        chunk.append((line_num, values, genres))
+        if len(chunk) >= chunk_size:
+            write_chunk(connection, chunk, report, consecutive_ids)
+            chunk = []
+            if progress:
+                progress(report)
+    if chunk:
+        write_chunk(connection, chunk, report, consecutive_ids)
+    if progress:
+        progress(report)
+    return report
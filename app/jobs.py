@@ -0,0 +1,311 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing
+import click
+from flask.cli import AppGroup
+
+STATES = ('queued', 'running', 'failed')
+
+
+class Handler:
+    def __init__(self, func, cpu=False, on_success=None, on_failure=None):
+        self.func = func
+        self.cpu = cpu
+        self.on_success = on_success
+        self.on_failure = on_failure
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobQueue:
+    def __init__(self, app, db, metrics=None):
+        self.app = app
+        self.db = db
+        self.metrics = metrics
+        self.path = app.config.get('JOB_JOURNAL', os.path.join(app.instance_path, 'jobs.sqlite3'))
+        self.threads = app.config.get('JOB_THREADS', 4)
+        self.processes = app.config.get('JOB_PROCESSES', 2)
+        self.max_attempts = app.config.get('JOB_MAX_ATTEMPTS', 5)
+        self.backoff = app.config.get('JOB_RETRY_BACKOFF', 2)
+        self.poll_interval = app.config.get('JOB_POLL_INTERVAL', 1)
+        self.handlers = {}
+        self.counters = {'enqueued': 0, 'completed': 0, 'retried': 0, 'failed': 0}
+        # У задач ввода-вывода и вычислительных задач свои очереди и диспетчеры:
+        # занятые процессы не задерживают задачи для потоков
+        queue_size = app.config.get('JOB_QUEUE_SIZE', 1000)
+        self._queues = {False: queue.Queue(maxsize=queue_size), True: queue.Queue(maxsize=queue_size)}
+        self._inflight = set()
+        self._slots = {False: threading.BoundedSemaphore(self.threads), True: threading.BoundedSemaphore(self.processes)}
+        self._executors = {}
+        self._dispatchers = None
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with closing(self._journal()) as journal:
+            journal.execute('PRAGMA journal_mode=WAL')
+            journal.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    args TEXT NOT NULL,
+                    state TEXT NOT NULL DEFAULT 'queued',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    run_at REAL NOT NULL,
+                    enqueued_at REAL NOT NULL,
+                    owner INTEGER,
+                    last_error TEXT
+                )
+            ''')
+            journal.execute('CREATE INDEX IF NOT EXISTS jobs_due ON jobs (state, run_at)')
+        app.before_request(self.start)
+        if metrics is not None:
+            metrics.add_collector(self.series)
+            metrics.add_collector(self.journal_series, per_worker=False)
+        self._register_cli()
+
+    def _journal(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def register(self, name, func, cpu=False, on_success=None, on_failure=None):
+        # Задачи для процессов должны быть функциями верхнего уровня: их передают через pickle
+        self.handlers[name] = Handler(func, cpu, on_success, on_failure)
+
+    def enqueue(self, name, *args):
+        if name not in self.handlers:
+            raise KeyError(f'Unknown job: {name}')
+        now = time.time()
+        with closing(self._journal()) as journal:
+            job_id = journal.execute('INSERT INTO jobs (name, args, run_at, enqueued_at) VALUES (?, ?, ?, ?)',
+                                     (name, json.dumps(args), now, now)).lastrowid
+        with self._lock:
+            self.counters['enqueued'] += 1
+        self.start()
+        self._offer(job_id, name)
+        return job_id
+
+    def after_commit(self, callback):
+        self.db.on_commit(callback)
+
+    def enqueue_on_commit(self, name, *args):
+        # Задача попадает в очередь только после успешного commit; при откате она отбрасывается
+        self.after_commit(lambda: self.enqueue(name, *args))
+
+    def is_cpu(self, name):
+        handler = self.handlers.get(name)
+        return handler is not None and handler.cpu
+
+    def _offer(self, job_id, name):
+        with self._lock:
+            if job_id in self._inflight:
+                return
+            try:
+                self._queues[self.is_cpu(name)].put_nowait(job_id)
+            except queue.Full:
+                # Очередь заполнена: задача остаётся в журнале и будет взята при следующем опросе
+                return
+            self._inflight.add(job_id)
+
+    def start(self):
+        if self._dispatchers is not None:
+            return
+        with self._lock:
+            if self._dispatchers is None:
+                self._dispatchers = [
+                    threading.Thread(target=self._dispatch, args=(cpu,), name=f'job-dispatcher-{kind}', daemon=True)
+                    for cpu, kind in ((False, 'io'), (True, 'cpu'))
+                ]
+                for dispatcher in self._dispatchers:
+                    dispatcher.start()
+
+    def executor(self, cpu):
+        with self._lock:
+            if cpu not in self._executors:
+                if cpu:
+                    self._executors[cpu] = ProcessPoolExecutor(max_workers=self.processes)
+                else:
+                    self._executors[cpu] = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='job')
+            return self._executors[cpu]
+
+    def _drop_executor(self, cpu, executor):
+        # Пул с погибшим процессом больше не принимает задачи: следующая получит новый
+        with self._lock:
+            if self._executors.get(cpu) is not executor:
+                return
+            del self._executors[cpu]
+        executor.shutdown(wait=False)
+        self.app.logger.warning('Job process pool is broken, starting a new one')
+
+    def _dispatch(self, cpu):
+        polled = 0
+        while True:
+            if time.monotonic() - polled >= self.poll_interval:
+                polled = time.monotonic()
+                try:
+                    self._poll(cpu)
+                except sqlite3.Error as err:
+                    self.app.logger.warning('Job journal poll failed: %s', err)
+            try:
+                job_id = self._queues[cpu].get(timeout=self.poll_interval)
+            except queue.Empty:
+                continue
+            try:
+                self._run(job_id)
+            except Exception as err:
+                with self._lock:
+                    self._inflight.discard(job_id)
+                self.app.logger.warning('Job %s was not started: %s', job_id, err)
+
+    def _poll(self, cpu):
+        free = self._queues[cpu].maxsize - self._queues[cpu].qsize()
+        cpu_names = [name for name, handler in self.handlers.items() if handler.cpu]
+        with closing(self._journal()) as journal:
+            # Задачи, которые выполнял завершившийся процесс или которые этот процесс потерял, возвращаются в очередь
+            for job_id, owner in journal.execute("SELECT id, owner FROM jobs WHERE state = 'running'").fetchall():
+                if owner == os.getpid():
+                    with self._lock:
+                        lost = job_id not in self._inflight
+                else:
+                    lost = owner is None or not pid_alive(owner)
+                if lost:
+                    journal.execute("UPDATE jobs SET state = 'queued', owner = NULL WHERE id = ? AND state = 'running'", (job_id,))
+            if free <= 0 or cpu and not cpu_names:
+                return
+            # Каждый диспетчер берёт из журнала только задачи своего вида
+            kind = ''
+            if cpu_names:
+                kind = f"AND name {'IN' if cpu else 'NOT IN'} ({', '.join('?' * len(cpu_names))})"
+            rows = journal.execute(f"SELECT id, name FROM jobs WHERE state = 'queued' AND run_at <= ? {kind} ORDER BY run_at LIMIT ?",
+                                   (time.time(), *cpu_names, free)).fetchall()
+        for job_id, name in rows:
+            self._offer(job_id, name)
+
+    def _run(self, job_id):
+        with closing(self._journal()) as journal:
+            # Журнал общий для всех воркеров: задачу выполняет тот, кто первым её занял
+            claimed = journal.execute("UPDATE jobs SET state = 'running', owner = ? WHERE id = ? AND state = 'queued'",
+                                      (os.getpid(), job_id)).rowcount
+            row = journal.execute('SELECT name, args, attempts, run_at FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if not claimed or row is None:
+            with self._lock:
+                self._inflight.discard(job_id)
+            return
+        name, args, attempts, run_at = row
+        args = json.loads(args)
+        handler = self.handlers.get(name)
+        if handler is None:
+            self._finish(job_id, name, args, attempts, KeyError(f'Unknown job: {name}'), None)
+            return
+        # Диспетчер ждёт только свободного исполнителя своего вида
+        self._slots[handler.cpu].acquire()
+        started = time.time()
+        if self.metrics is not None:
+            self.metrics.observe('job_wait_seconds', (('job', name),), max(started - run_at, 0))
+        executor = self.executor(handler.cpu)
+        try:
+            future = executor.submit(handler.func, *args)
+        except Exception as err:
+            # Задача уже помечена как выполняемая этим процессом: без _finish она бы так и осталась в журнале
+            self._slots[handler.cpu].release()
+            if isinstance(err, BrokenProcessPool):
+                self._drop_executor(handler.cpu, executor)
+            self._finish(job_id, name, args, attempts, err, handler)
+            return
+        future.add_done_callback(lambda f: self._done(job_id, name, args, attempts, handler, started, executor, f))
+
+    def _done(self, job_id, name, args, attempts, handler, started, executor, future):
+        self._slots[handler.cpu].release()
+        error = future.exception()
+        if isinstance(error, BrokenProcessPool):
+            self._drop_executor(handler.cpu, executor)
+        if self.metrics is not None:
+            self.metrics.observe('job_duration_seconds', (('job', name), ('status', 'ok' if error is None else 'error')),
+                                 time.time() - started)
+        self._finish(job_id, name, args, attempts, error, handler)
+
+    def _finish(self, job_id, name, args, attempts, error, handler):
+        attempts += 1
+        try:
+            with closing(self._journal()) as journal:
+                if error is None:
+                    journal.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+                    counter = 'completed'
+                elif attempts < self.max_attempts and handler is not None:
+                    journal.execute("UPDATE jobs SET state = 'queued', owner = NULL, attempts = ?, run_at = ?, last_error = ? WHERE id = ?",
+                                    (attempts, time.time() + self.backoff ** attempts, repr(error), job_id))
+                    counter = 'retried'
+                else:
+                    journal.execute("UPDATE jobs SET state = 'failed', owner = NULL, attempts = ?, last_error = ? WHERE id = ?",
+                                    (attempts, repr(error), job_id))
+                    counter = 'failed'
+        finally:
+            with self._lock:
+                self._inflight.discard(job_id)
+        with self._lock:
+            self.counters[counter] += 1
+        if counter == 'retried':
+            self.app.logger.info('Job %s %s failed (attempt %d), retrying: %r', name, job_id, attempts, error)
+        elif counter == 'failed':
+            self.app.logger.warning('Job %s %s failed after %d attempts: %r', name, job_id, attempts, error)
+        callback = None
+        if handler is not None:
+            callback = handler.on_success if counter == 'completed' else handler.on_failure if counter == 'failed' else None
+        if callback is not None:
+            callback(*args)
+
+    def journal_stats(self):
+        with closing(self._journal()) as journal:
+            counts = dict(journal.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+        return {state: counts.get(state, 0) for state in STATES}
+
+    def series(self):
+        with self._lock:
+            counters = dict(self.counters)
+            inflight = len(self._inflight)
+        return [
+            ('jobs_queue_depth', 'gauge', 'Jobs waiting in the in-memory queues of the workers',
+             [((('kind', 'cpu' if cpu else 'io'),), jobs.qsize()) for cpu, jobs in self._queues.items()]),
+            ('jobs_inflight', 'gauge', 'Jobs queued or running in the workers', [((), inflight)]),
+            ('jobs_processed_total', 'counter', 'Jobs processed since worker start',
+             [((('result', result),), count) for result, count in counters.items()]),
+        ]
+
+    def journal_series(self):
+        # Журнал общий для воркеров: его не суммируем
+        return [
+            ('jobs_journal', 'gauge', 'Jobs in the shared journal by state',
+             [((('state', state),), count) for state, count in self.journal_stats().items()]),
+        ]
+
+    def _register_cli(self):
+        cli = AppGroup('jobs', help='Фоновые задачи')
+
+        @cli.command('status')
+        def status_command():
+            for state, count in self.journal_stats().items():
+                click.echo(f'{state:<10} {count}')
+            with closing(self._journal()) as journal:
+                for job_id, name, attempts, error in journal.execute(
+                        "SELECT id, name, attempts, last_error FROM jobs WHERE state = 'failed' ORDER BY id"):
+                    click.echo(f'#{job_id} {name}, попыток {attempts}: {error}')
+
+        @cli.command('retry')
+        def retry_command():
+            with closing(self._journal()) as journal:
+                count = journal.execute("UPDATE jobs SET state = 'queued', attempts = 0, run_at = ? WHERE state = 'failed'",
+                                        (time.time(),)).rowcount
+            click.echo(f'Возвращено в очередь задач: {count}')
+
+        self.app.cli.add_command(cli)
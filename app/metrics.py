@@ -0,0 +1,192 @@
+import glob
+import json
+import os
+import threading
+import time
+from flask import g, request, template_rendered, before_render_template
+from jobs import pid_alive
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+HISTOGRAMS = {
+    'http_request_duration_seconds': ('Request latency by endpoint and status', DURATION_BUCKETS),
+    'http_request_sql_queries': ('SQL queries per request', QUERY_BUCKETS),
+    'http_request_sql_seconds': ('Total SQL time per request', DURATION_BUCKETS),
+    'template_render_seconds': ('Template render time', DURATION_BUCKETS),
+    'job_wait_seconds': ('Time a background job waited in the queue', DURATION_BUCKETS),
+    'job_duration_seconds': ('Background job run time by job and status', DURATION_BUCKETS),
+}
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    return ','.join(f'{key}="{escape(value)}"' for key, value in labels)
+
+
+def pool_series(pool):
+    stats = pool.stats()
+    return [
+        ('mysql_pool_connections', 'gauge', 'MySQL pool connections by state',
+         [((('state', state),), stats[state]) for state in ('size', 'in_use', 'idle')]),
+        ('mysql_pool_events_total', 'counter', 'MySQL pool events since worker start',
+         [((('event', event),), stats[event]) for event in pool.counters]),
+    ]
+
+
+class Metrics:
+    def __init__(self, app, db):
+        self.app = app
+        self.directory = app.config.get('METRICS_DIR')
+        self.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', 1)
+        # Источники значений вне гистограмм: (callback, per_worker). Значения воркеров суммируются
+        # через METRICS_DIR; общие для всех воркеров (per_worker=False) читаются один раз при выгрузке
+        self.collectors = []
+        self._histograms = {name: {} for name in HISTOGRAMS}
+        self._lock = threading.Lock()
+        self._flushed = 0
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        app.before_request(self._request_started)
+        app.after_request(self._request_finished)
+        app.teardown_request(self._request_failed)
+        before_render_template.connect(self._render_started, app)
+        template_rendered.connect(self._render_finished, app)
+        db.query_listeners.append(self._query)
+        self.add_collector(lambda: pool_series(db.pool()))
+        app.add_url_rule('/metrics', 'metrics', self.export)
+
+    def add_collector(self, callback, per_worker=True):
+        # callback возвращает список (name, type, help, [(labels, value), ...]), type — counter или gauge
+        self.collectors.append((callback, per_worker))
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        with self._lock:
+            series = self._histograms[name].get(labels)
+            if series is None:
+                series = self._histograms[name][labels] = [[0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def _request_started(self):
+        g.metrics_started = time.perf_counter()
+        g.sql_queries = 0
+        g.sql_seconds = 0.0
+
+    def _query(self, operation, params, duration, cursor):
+        if 'sql_queries' in g:
+            g.sql_queries += 1
+            g.sql_seconds += duration
+
+    def _record_request(self, status):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        endpoint = request.endpoint or 'none'
+        self.observe('http_request_duration_seconds',
+                     (('endpoint', endpoint), ('method', request.method), ('status', status)),
+                     time.perf_counter() - started)
+        self.observe('http_request_sql_queries', (('endpoint', endpoint),), g.sql_queries)
+        self.observe('http_request_sql_seconds', (('endpoint', endpoint),), g.sql_seconds)
+        if self.directory and time.monotonic() - self._flushed >= self.flush_interval:
+            self.flush()
+
+    def _request_finished(self, response):
+        self._record_request(response.status_code)
+        return response
+
+    def _request_failed(self, exc=None):
+        if exc is not None:
+            self._record_request(500)
+
+    def _render_started(self, sender, template, context, **extra):
+        g.setdefault('render_started', []).append(time.perf_counter())
+
+    def _render_finished(self, sender, template, context, **extra):
+        stack = g.get('render_started')
+        if stack:
+            self.observe('template_render_seconds', (('template', template.name),), time.perf_counter() - stack.pop())
+
+    def series(self, per_worker=True):
+        return [item for callback, worker in self.collectors if worker == per_worker for item in callback()]
+
+    def snapshot(self):
+        with self._lock:
+            histograms = {
+                name: [[list(labels), list(series[0]), series[1], series[2]] for labels, series in data.items()]
+                for name, data in self._histograms.items()
+            }
+        series = [[name, kind, help_text, [[list(labels), value] for labels, value in values]]
+                  for name, kind, help_text, values in self.series()]
+        return {'pid': os.getpid(), 'histograms': histograms, 'series': series}
+
+    def flush(self):
+        self._flushed = time.monotonic()
+        path = os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, path)
+
+    def collect(self):
+        if not self.directory:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            # Файлы в старом формате остаются от прошлого запуска, если каталог не очистили
+            if 'series' in snapshot:
+                snapshots.append(snapshot)
+        return snapshots
+
+    def export(self):
+        merged = {name: {} for name in HISTOGRAMS}
+        totals = {}
+        for snapshot in self.collect():
+            for name, series_list in snapshot['histograms'].items():
+                for labels, counts, total, count in series_list:
+                    labels = tuple(tuple(label) for label in labels)
+                    series = merged[name].setdefault(labels, [[0] * len(counts), 0.0, 0])
+                    series[0] = [a + b for a, b in zip(series[0], counts)]
+                    series[1] += total
+                    series[2] += count
+            # Счётчики завершившихся воркеров остаются в сумме, чтобы она не убывала;
+            # их последние мгновенные значения уже неверны
+            alive = snapshot['pid'] == os.getpid() or pid_alive(snapshot['pid'])
+            for name, kind, help_text, values in snapshot['series']:
+                if kind == 'gauge' and not alive:
+                    continue
+                entry = totals.setdefault(name, (kind, help_text, {}))
+                for labels, value in values:
+                    labels = tuple(tuple(label) for label in labels)
+                    entry[2][labels] = entry[2].get(labels, 0) + value
+        for name, kind, help_text, values in self.series(per_worker=False):
+            totals[name] = (kind, help_text, dict(values))
+        lines = []
+        for name, (help_text, buckets) in HISTOGRAMS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, (counts, total, count) in sorted(merged[name].items()):
+                for bound, bucket_count in zip(buckets, counts):
+                    lines.append(f'{name}_bucket{{{format_labels(labels + (("le", bound),))}}} {bucket_count}')
+                lines.append(f'{name}_bucket{{{format_labels(labels + (("le", "+Inf"),))}}} {count}')
+                lines.append(f'{name}_sum{{{format_labels(labels)}}} {total}')
+                lines.append(f'{name}_count{{{format_labels(labels)}}} {count}')
+        for name, (kind, help_text, values) in totals.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in sorted(values.items()):
+                lines.append(f'{name}{{{format_labels(labels)}}} {value}')
+        return '\n'.join(lines) + '\n', 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
@@ -0,0 +1,161 @@
+import importlib.util
+import os
+import time
+import click
+from flask.cli import AppGroup
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+LOCK_NAME = 'schema_migrations'
+
+
+class MigrationError(Exception):
+    pass
+
+
+def has_table(cursor, table):
+    cursor.execute('''
+        SELECT 1 FROM information_schema.tables
+        WHERE table_schema = DATABASE() AND table_name = %s
+    ''', (table,))
+    return cursor.fetchone() is not None
+
+
+def has_column(cursor, table, column):
+    cursor.execute('''
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    ''', (table, column))
+    return cursor.fetchone() is not None
+
+
+def index_columns(cursor, table, index):
+    cursor.execute('''
+        SELECT column_name FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        ORDER BY seq_in_index
+    ''', (table, index))
+    return tuple(row[0] for row in cursor.fetchall())
+
+
+def has_index_on(cursor, table, columns):
+    cursor.execute('''
+        SELECT index_name FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s
+        GROUP BY index_name
+        HAVING GROUP_CONCAT(column_name ORDER BY seq_in_index) = %s
+    ''', (table, ','.join(columns)))
+    return cursor.fetchone() is not None
+
+
+def has_foreign_key(cursor, table, column, referenced_table):
+    cursor.execute('''
+        SELECT 1 FROM information_schema.key_column_usage
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+          AND referenced_table_name = %s
+    ''', (table, column, referenced_table))
+    return cursor.fetchone() is not None
+
+
+def online(cursor, statement, lock='NONE'):
+    # Индексы строятся без блокировки записи: InnoDB копит изменения во время сборки
+    cursor.execute(f'{statement}, ALGORITHM=INPLACE, LOCK={lock}')
+
+
+def delete_in_batches(connection, statement, params=(), batch_size=10000):
+    cursor = connection.cursor()
+    deleted = 0
+    while True:
+        cursor.execute(f'{statement} LIMIT {int(batch_size)}', params)
+        connection.commit()
+        deleted += cursor.rowcount
+        if cursor.rowcount < batch_size:
+            cursor.close()
+            return deleted
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        version, ext = os.path.splitext(filename)
+        if ext != '.py' or not version[:1].isdigit():
+            continue
+        spec = importlib.util.spec_from_file_location(f'migrations.{version}', os.path.join(directory, filename))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        migrations.append((version, module))
+    return migrations
+
+
+class Migrations:
+    def __init__(self, app, db):
+        self.app = app
+        self.db = db
+        self.lock_timeout = app.config.get('MIGRATIONS_LOCK_TIMEOUT', 60)
+        cli = AppGroup('db', help='Миграции схемы базы данных')
+
+        @cli.command('upgrade')
+        @click.option('--target', help='применить миграции до этой версии включительно')
+        def upgrade_command(target):
+            try:
+                done = self.upgrade(target, echo=click.echo)
+            except MigrationError as e:
+                raise click.ClickException(str(e))
+            click.echo(f'Применено миграций: {len(done)}' if done else 'Схема уже актуальна')
+
+        @cli.command('status')
+        def status_command():
+            cursor = self.db.connection().cursor()
+            applied = self.applied(cursor)
+            cursor.close()
+            for version, _ in load_migrations():
+                state = f'применена {applied[version]}' if version in applied else 'не применена'
+                click.echo(f'{version:<40} {state}')
+
+        app.cli.add_command(cli)
+
+    def ensure_table(self, cursor):
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version VARCHAR(255) NOT NULL PRIMARY KEY,
+                applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                duration_ms INT NOT NULL
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        ''')
+
+    def applied(self, cursor):
+        self.ensure_table(cursor)
+        cursor.execute('SELECT version, applied_at FROM schema_migrations')
+        return dict(cursor.fetchall())
+
+    def upgrade(self, target=None, echo=print):
+        connection = self.db.connection()
+        cursor = connection.cursor()
+        # Не даём двум воркерам или деплоям накатывать миграции одновременно
+        cursor.execute('SELECT GET_LOCK(%s, %s)', (LOCK_NAME, self.lock_timeout))
+        if cursor.fetchone()[0] != 1:
+            raise MigrationError(f'Миграции уже выполняются: блокировка не получена за {self.lock_timeout} с')
+        try:
+            applied = self.applied(cursor)
+            done = []
+            for version, module in load_migrations():
+                if target is not None and version > target:
+                    break
+                if version in applied:
+                    continue
+                echo(f'{version}...')
+                started = time.monotonic()
+                try:
+                    module.upgrade(connection)
+                except Exception as e:
+                    connection.rollback()
+                    raise MigrationError(f'Миграция {version} не применена: {e}') from e
+                duration_ms = int((time.monotonic() - started) * 1000)
+                cursor.execute('INSERT INTO schema_migrations (version, duration_ms) VALUES (%s, %s)', (version, duration_ms))
+                connection.commit()
+                echo(f'{version} применена за {duration_ms} мс')
+                done.append(version)
+            return done
+        finally:
+            cursor.execute('SELECT RELEASE_LOCK(%s)', (LOCK_NAME,))
+            cursor.fetchall()
+            cursor.close()
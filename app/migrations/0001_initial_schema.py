@@ -0,0 +1,50 @@
+TABLES = (
+    '''
+    CREATE TABLE IF NOT EXISTS roles (
+        id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(50) NOT NULL,
+        description TEXT
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        login VARCHAR(100) NOT NULL,
+        password_hash VARCHAR(256) NOT NULL,
+        last_name VARCHAR(100) NOT NULL,
+        first_name VARCHAR(100) NOT NULL,
+        middle_name VARCHAR(100),
+        role_id INT NOT NULL
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS genres (
+        id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(100) NOT NULL UNIQUE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS books (
+        id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        description TEXT NOT NULL,
+        year INT NOT NULL,
+        publishing VARCHAR(255) NOT NULL,
+        author VARCHAR(255) NOT NULL,
+        pages INT NOT NULL
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS book_genres (
+        book_id INT NOT NULL,
+        genre_id INT NOT NULL
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    ''',
+)
+
+
+def upgrade(connection):
+    cursor = connection.cursor()
+    for statement in TABLES:
+        cursor.execute(statement)
+    cursor.close()
@@ -0,0 +1,11 @@
+from migrate import has_column, has_index_on, online
+
+
+def upgrade(connection):
+    cursor = connection.cursor()
+    if not has_column(cursor, 'books', 'cover'):
+        online(cursor, 'ALTER TABLE books ADD COLUMN cover VARCHAR(64) NULL')
+    if not has_index_on(cursor, 'books', ('name', 'author', 'description', 'publishing')):
+        # Первый FULLTEXT-индекс перестраивает таблицу, запись на это время блокируется, чтение нет
+        online(cursor, 'ALTER TABLE books ADD FULLTEXT INDEX books_fulltext (name, author, description, publishing)', lock='SHARED')
+    cursor.close()
@@ -0,0 +1,44 @@
+from migrate import MigrationError, has_index_on, index_columns, online
+
+
+def remove_duplicate_links(cursor):
+    cursor.execute('''
+        SELECT book_id, genre_id, COUNT(*) FROM book_genres
+        GROUP BY book_id, genre_id HAVING COUNT(*) > 1
+    ''')
+    for book_id, genre_id, count in cursor.fetchall():
+        cursor.execute('DELETE FROM book_genres WHERE book_id = %s AND genre_id = %s LIMIT %s', (book_id, genre_id, count - 1))
+
+
+def upgrade(connection):
+    cursor = connection.cursor()
+
+    # Главная страница: ORDER BY year DESC, id и поиск по ключу (year, id);
+    # индекс в том же порядке читается без сортировки
+    if not has_index_on(cursor, 'books', ('year', 'id')):
+        online(cursor, 'ALTER TABLE books ADD INDEX books_year_id (year DESC, id)')
+
+    # Связи книга-жанр читаются в обе стороны: жанры книги и книги жанра
+    primary = index_columns(cursor, 'book_genres', 'PRIMARY')
+    if primary != ('book_id', 'genre_id'):
+        remove_duplicate_links(cursor)
+        connection.commit()
+        if primary:
+            if not has_index_on(cursor, 'book_genres', ('book_id', 'genre_id')):
+                online(cursor, 'ALTER TABLE book_genres ADD UNIQUE INDEX book_genres_book_genre (book_id, genre_id)')
+        else:
+            online(cursor, 'ALTER TABLE book_genres ADD PRIMARY KEY (book_id, genre_id)')
+    if not has_index_on(cursor, 'book_genres', ('genre_id',)) and not has_index_on(cursor, 'book_genres', ('genre_id', 'book_id')):
+        online(cursor, 'ALTER TABLE book_genres ADD INDEX book_genres_genre (genre_id)')
+
+    # Вход по логину
+    cursor.execute('SELECT index_name FROM information_schema.statistics '
+                   'WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s AND non_unique = 0 AND seq_in_index = 1',
+                   ('users', 'login'))
+    if not cursor.fetchall():
+        cursor.execute('SELECT login FROM users GROUP BY login HAVING COUNT(*) > 1')
+        duplicates = [row[0] for row in cursor.fetchall()]
+        if duplicates:
+            raise MigrationError(f'логины повторяются, исправьте вручную: {", ".join(duplicates)}')
+        online(cursor, 'ALTER TABLE users ADD UNIQUE INDEX users_login (login)')
+    cursor.close()
@@ -0,0 +1,30 @@
+from migrate import MigrationError, delete_in_batches, has_foreign_key, online
+
+
+def add_foreign_key(cursor, table, column, referenced_table, on_delete):
+    # С выключенной проверкой ключ добавляется без копирования таблицы;
+    # висячие строки удалены заранее, поэтому проверять нечего
+    cursor.execute('SET SESSION foreign_key_checks = 0')
+    try:
+        online(cursor, f'ALTER TABLE {table} ADD CONSTRAINT {table}_{column}_fk FOREIGN KEY ({column}) '
+                       f'REFERENCES {referenced_table} (id) ON DELETE {on_delete}')
+    finally:
+        cursor.execute('SET SESSION foreign_key_checks = 1')
+
+
+def upgrade(connection):
+    cursor = connection.cursor()
+    if not has_foreign_key(cursor, 'book_genres', 'book_id', 'books'):
+        delete_in_batches(connection, 'DELETE FROM book_genres WHERE NOT EXISTS (SELECT 1 FROM books WHERE books.id = book_genres.book_id)')
+        add_foreign_key(cursor, 'book_genres', 'book_id', 'books', 'CASCADE')
+    if not has_foreign_key(cursor, 'book_genres', 'genre_id', 'genres'):
+        delete_in_batches(connection, 'DELETE FROM book_genres WHERE NOT EXISTS (SELECT 1 FROM genres WHERE genres.id = book_genres.genre_id)')
+        add_foreign_key(cursor, 'book_genres', 'genre_id', 'genres', 'CASCADE')
+    if not has_foreign_key(cursor, 'users', 'role_id', 'roles'):
+        # Пользователей без роли не удаляем: их нужно исправить вручную
+        cursor.execute('SELECT login FROM users WHERE NOT EXISTS (SELECT 1 FROM roles WHERE roles.id = users.role_id)')
+        orphans = [row[0] for row in cursor.fetchall()]
+        if orphans:
+            raise MigrationError(f'у пользователей нет существующей роли: {", ".join(orphans)}')
+        add_foreign_key(cursor, 'users', 'role_id', 'roles', 'RESTRICT')
+    cursor.close()
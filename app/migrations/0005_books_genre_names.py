@@ -0,0 +1,17 @@
+from books import UPDATE_GENRE_NAMES
+from migrate import has_column, online
+
+BATCH_SIZE = 5000
+
+
+def upgrade(connection):
+    cursor = connection.cursor()
+    if not has_column(cursor, 'books', 'genre_names'):
+        online(cursor, "ALTER TABLE books ADD COLUMN genre_names VARCHAR(1000) NOT NULL DEFAULT ''")
+
+    cursor.execute('SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), 0) FROM books')
+    first_id, last_id = cursor.fetchone()
+    for start in range(first_id, last_id + 1, BATCH_SIZE):
+        cursor.execute(f'{UPDATE_GENRE_NAMES} WHERE id BETWEEN %s AND %s', (start, start + BATCH_SIZE - 1))
+        connection.commit()
+    cursor.close()
@@ -0,0 +1,32 @@
+from migrate import has_table
+
+# Права, которые раньше были зашиты в CheckUser: администратор, модератор, остальные роли
+ADMIN_ROLE_ID = 1
+MODER_ROLE_ID = 2
+DEFAULT_RIGHTS = {
+    ADMIN_ROLE_ID: ('create', 'show', 'edit', 'delete'),
+    MODER_ROLE_ID: ('show', 'edit'),
+}
+OTHER_RIGHTS = ('show',)
+
+
+def upgrade(connection):
+    cursor = connection.cursor()
+    if has_table(cursor, 'role_permissions'):
+        cursor.close()
+        return
+    cursor.execute('''
+        CREATE TABLE role_permissions (
+            role_id INT NOT NULL,
+            action VARCHAR(32) NOT NULL,
+            PRIMARY KEY (role_id, action),
+            CONSTRAINT role_permissions_role_id_fk FOREIGN KEY (role_id) REFERENCES roles (id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    ''')
+    cursor.execute('SELECT id FROM roles')
+    rows = [(role_id, action) for (role_id,) in cursor.fetchall()
+            for action in DEFAULT_RIGHTS.get(role_id, OTHER_RIGHTS)]
+    if rows:
+        cursor.executemany('INSERT INTO role_permissions (role_id, action) VALUES (%s, %s)', rows)
+    connection.commit()
+    cursor.close()
@@ -1,18 +1,254 @@
+import logging
+import queue
+import re
+import threading
+import time
+from collections import namedtuple
 import mysql.connector
-from flask import g
+from mysql.connector.errors import Error, PoolError
+from flask import g, has_request_context, request
+
+slow_log = logging.getLogger('mysql.slow')
+
+QueryRecord = namedtuple('QueryRecord', 'sql params duration rows')
+
+STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER = re.compile(r'%s|%\(\w+\)s')
+VALUE_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*')
+
+
+def normalize_sql(operation):
+    if isinstance(operation, bytes):
+        operation = operation.decode(errors='replace')
+    sql = STRING_LITERAL.sub('?', operation)
+    sql = NUMBER_LITERAL.sub('?', sql)
+    sql = PLACEHOLDER.sub('?', sql)
+    sql = VALUE_LIST.sub('(...)', sql)
+    return ' '.join(sql.split())
+
+
+def params_shape(params):
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    if isinstance(params, list) and params and isinstance(params[0], (tuple, list, dict)):
+        return f'{len(params)} x {params_shape(params[0])}'
+    return tuple(type(value).__name__ for value in params)
+
+
+class ConnectionPool:
+    def __init__(self, config, size=5, timeout=10, recycle=3600):
+        self.config = config
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self.counters = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'resets': 0,
+            'recycled': 0,
+            'created': 0,
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def acquire(self):
+        if not self._slots.acquire(blocking=False):
+            self._count('waits')
+            if not self._slots.acquire(timeout=self.timeout):
+                self._count('timeouts')
+                raise PoolError(f'No free MySQL connection after {self.timeout}s')
+        try:
+            conn = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.counters['checkouts'] += 1
+            self._in_use += 1
+        return conn
+
+    def _checkout(self):
+        while True:
+            try:
+                conn, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                self._count('created')
+                return mysql.connector.connect(**self.config)
+            if time.monotonic() - released_at > self.recycle:
+                self._close(conn)
+                self._count('recycled')
+                continue
+            try:
+                conn.ping(reconnect=False)
+                return conn
+            except Error:
+                self._close(conn)
+                self._count('resets')
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put((conn, time.monotonic()))
+        except Error:
+            self._close(conn)
+            self._count('resets')
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def discard(self, conn):
+        self._close(conn)
+        with self._lock:
+            self.counters['resets'] += 1
+            self._in_use -= 1
+        self._slots.release()
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Error:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, size=self.size, in_use=self._in_use, idle=self._idle.qsize())
+
+
+class TimedCursor:
+    def __init__(self, cursor, listeners):
+        self._cursor = cursor
+        self._listeners = listeners
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            self._notify(operation, params, time.perf_counter() - start)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            self._notify(operation, seq_params, time.perf_counter() - start)
+
+    def _notify(self, operation, params, duration):
+        for listener in self._listeners:
+            listener(operation, params, duration, self._cursor)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class TimedConnection:
+    def __init__(self, connection, listeners, logger=None):
+        self.raw = connection
+        self._listeners = listeners
+        self._logger = logger or logging.getLogger(__name__)
+        self.commit_callbacks = []
+        self.rollback_callbacks = []
+
+    def cursor(self, *args, **kwargs):
+        cursor = self.raw.cursor(*args, **kwargs)
+        if not self._listeners:
+            return cursor
+        return TimedCursor(cursor, self._listeners)
+
+    def commit(self):
+        self.raw.commit()
+        self.rollback_callbacks = []
+        callbacks, self.commit_callbacks = self.commit_callbacks, []
+        # Данные уже сохранены: ошибка обработчика не должна выглядеть как неудачный commit
+        self._run_callbacks(callbacks)
+
+    def rollback(self):
+        self.commit_callbacks = []
+        self.raw.rollback()
+        callbacks, self.rollback_callbacks = self.rollback_callbacks, []
+        self._run_callbacks(callbacks)
+
+    def _run_callbacks(self, callbacks):
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                self._logger.exception('Transaction callback %r failed', callback)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
 
 
 class MySQL:
     def __init__(self,app):
         self.app = app
+        self.slow_query_seconds = app.config.get('MYSQL_SLOW_QUERY_MS', 200) / 1000
+        self.n_plus_one_threshold = app.config.get('MYSQL_N_PLUS_ONE_THRESHOLD', 5)
+        self.query_listeners = [self.inspect_query]
+        self._pool = None
+        self._pool_lock = threading.Lock()
         self.app.teardown_appcontext(self.close_connection)
-        
+        if app.config.get('MYSQL_SLOW_LOG'):
+            handler = logging.FileHandler(app.config['MYSQL_SLOW_LOG'])
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            slow_log.addHandler(handler)
+            slow_log.setLevel(logging.WARNING)
+
+    def inspect_query(self, operation, params, duration, cursor):
+        if duration < self.slow_query_seconds and not self.app.debug:
+            return
+        record = QueryRecord(normalize_sql(operation), params_shape(params), duration, cursor.rowcount)
+        if duration >= self.slow_query_seconds:
+            slow_log.warning('%.1f ms, %s rows: %s %s', duration * 1000, record.rows, record.sql, record.params)
+        if self.app.debug:
+            g.setdefault('queries', []).append(record)
+            counts = g.setdefault('query_counts', {})
+            counts[record.sql] = counts.get(record.sql, 0) + 1
+            if counts[record.sql] == self.n_plus_one_threshold:
+                where = request.path if has_request_context() else 'CLI'
+                self.app.logger.warning('Possible N+1 in %s: %s executed %d times', where, record.sql, counts[record.sql])
+
+    def pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ConnectionPool(
+                        self.config(),
+                        size=self.app.config.get('MYSQL_POOL_SIZE', 5),
+                        timeout=self.app.config.get('MYSQL_POOL_TIMEOUT', 10),
+                        recycle=self.app.config.get('MYSQL_POOL_RECYCLE', 3600),
+                    )
+        return self._pool
+
     def connection(self):
         if 'db' not in g:
-            g.db = mysql.connector.connect(**self.config())
+            g.db = TimedConnection(self.pool().acquire(), self.query_listeners, self.app.logger)
         return g.db
 
-    
+
+    def on_commit(self, callback):
+        # Выполнить после следующего commit этого запроса; при откате или без commit не выполняется
+        self.connection().commit_callbacks.append(callback)
+
+    def on_rollback(self, callback):
+        # Выполнить после явного rollback этого запроса; commit отменяет вызов
+        self.connection().rollback_callbacks.append(callback)
+
     def config(self):
         return {
             'user': self.app.config['MYSQL_USER'],
@@ -20,8 +256,13 @@ class MySQL:
             'host': self.app.config['MYSQL_HOST'],
             'database': self.app.config['MYSQL_DATABASE'],
         }
-    
+
+    def discard_connection(self):
+        db = g.pop('db', None)
+        if db is not None:
+            self.pool().discard(db.raw)
+
     def close_connection(self, e=None):
         db = g.pop('db', None)
         if db is not None:
-            db.close()
\ No newline at end of file
+            self.pool().release(db.raw)
@@ -0,0 +1,162 @@
+import math
+import re
+from flask import render_template, request, flash, url_for, Blueprint
+from app import db, cache, get_genres
+from cache import TTLCache
+import mysql.connector
+
+bp_search = Blueprint('search', __name__, url_prefix='/search')
+
+PER_PAGE = 10
+MIN_WORD_LENGTH = 3
+MATCH = 'MATCH(b.name, b.author, b.description, b.publishing) AGAINST (%s IN BOOLEAN MODE)'
+PAGES_BOUNDS = (100, 300, 500)
+
+facets_cache = TTLCache(ttl=300, maxsize=1000)
+
+
+def boolean_query(text):
+    words = [word for word in re.findall(r'\w+', text or '') if len(word) >= MIN_WORD_LENGTH]
+    return ' '.join(f'+{word}*' for word in words)
+
+
+def build_where(filters, skip=None):
+    clauses = []
+    params = []
+    if filters['q']:
+        clauses.append(MATCH)
+        params.append(filters['q'])
+    if filters['genres'] and skip != 'genres':
+        placeholders = ', '.join(['%s'] * len(filters['genres']))
+        clauses.append(f'b.id IN (SELECT book_id FROM book_genres WHERE genre_id IN ({placeholders}))')
+        params.extend(filters['genres'])
+    if skip != 'year':
+        if filters['year_from'] is not None:
+            clauses.append('b.year >= %s')
+            params.append(filters['year_from'])
+        if filters['year_to'] is not None:
+            clauses.append('b.year <= %s')
+            params.append(filters['year_to'])
+    if skip != 'pages':
+        if filters['pages_from'] is not None:
+            clauses.append('b.pages >= %s')
+            params.append(filters['pages_from'])
+        if filters['pages_to'] is not None:
+            clauses.append('b.pages <= %s')
+            params.append(filters['pages_to'])
+    where = 'WHERE ' + ' AND '.join(clauses) if clauses else ''
+    return where, params
+
+
+def search_books(filters, page):
+    where, params = build_where(filters)
+    order = 'score DESC, b.year DESC, b.id' if filters['q'] else 'b.year DESC, b.id'
+    score = MATCH if filters['q'] else '0'
+    score_params = [filters['q']] if filters['q'] else []
+    query = f'''
+        SELECT b.*, b.genre_names AS genres, {score} AS score
+        FROM books b
+        {where}
+        ORDER BY {order}
+        LIMIT %s OFFSET %s
+    '''
+    cursor = db.connection().cursor(named_tuple=True)
+    cursor.execute(query, (*score_params, *params, PER_PAGE, PER_PAGE * (page - 1)))
+    books = cursor.fetchall()
+    cursor.close()
+    return books
+
+
+def load_facets(filters):
+    cursor = db.connection().cursor()
+    facets = {}
+
+    where, params = build_where(filters)
+    cursor.execute(f'SELECT COUNT(*) FROM books b {where}', params)
+    facets['total'] = cursor.fetchone()[0]
+
+    where, params = build_where(filters, skip='genres')
+    cursor.execute(f'''
+        SELECT bg.genre_id, COUNT(*)
+        FROM books b JOIN book_genres bg ON b.id = bg.book_id
+        {where}
+        GROUP BY bg.genre_id
+    ''', params)
+    facets['genres'] = dict(cursor.fetchall())
+
+    where, params = build_where(filters, skip='year')
+    cursor.execute(f'''
+        SELECT FLOOR(b.year / 10) * 10 AS decade, COUNT(*)
+        FROM books b
+        {where}
+        GROUP BY decade
+        ORDER BY decade DESC
+    ''', params)
+    facets['years'] = [(int(decade), count) for decade, count in cursor.fetchall() if decade is not None]
+
+    where, params = build_where(filters, skip='pages')
+    bounds = ', '.join(str(bound) for bound in PAGES_BOUNDS)
+    cursor.execute(f'''
+        SELECT INTERVAL(b.pages, {bounds}) AS bucket, COUNT(*)
+        FROM books b
+        {where}
+        GROUP BY bucket
+        ORDER BY bucket
+    ''', params)
+    lower = (0,) + PAGES_BOUNDS
+    upper = tuple(bound - 1 for bound in PAGES_BOUNDS) + (None,)
+    facets['pages'] = [(lower[bucket], upper[bucket], count) for bucket, count in cursor.fetchall() if bucket >= 0]
+
+    cursor.close()
+    return facets
+
+
+def get_facets(filters):
+    key = (cache.version('catalog'), tuple(sorted(filters.items())))
+    facets = facets_cache.get(key)
+    if facets is None:
+        facets = load_facets(filters)
+        facets_cache.set(key, facets)
+    return facets
+
+
+def read_filters():
+    return {
+        'q': boolean_query(request.args.get('q')),
+        'genres': tuple(sorted(set(request.args.getlist('genre', type=int)))),
+        'year_from': request.args.get('year_from', type=int),
+        'year_to': request.args.get('year_to', type=int),
+        'pages_from': request.args.get('pages_from', type=int),
+        'pages_to': request.args.get('pages_to', type=int),
+    }
+
+
+def search_url(**changes):
+    args = request.args.to_dict(flat=False)
+    args.pop('page', None)
+    args.update(changes)
+    return url_for('search.index', **{key: value for key, value in args.items() if value is not None})
+
+
+@bp_search.route('/')
+def index():
+    filters = read_filters()
+    page = max(request.args.get('page', 1, type=int), 1)
+    books = []
+    facets = {'total': 0, 'genres': {}, 'years': [], 'pages': []}
+    try:
+        facets = get_facets(filters)
+        books = search_books(filters, page)
+    except mysql.connector.errors.DatabaseError:
+        db.connection().rollback()
+        flash('Произошла ошибка при поиске!', 'danger')
+    return render_template(
+        'books/search.html',
+        books=books,
+        facets=facets,
+        filters=filters,
+        genres=get_genres(),
+        search_url=search_url,
+        page=page,
+        count=math.ceil(facets['total'] / PER_PAGE),
+    )
@@ -0,0 +1,91 @@
+import threading
+import time
+import click
+import mysql.connector
+from books import UPDATE_GENRE_NAMES
+
+LOCK_NAME = 'orphan_sweeper'
+SWEEPS = (
+    ('books', 'book_id'),
+    ('genres', 'genre_id'),
+)
+
+
+class OrphanSweeper:
+    def __init__(self, app, db, cache=None):
+        self.app = app
+        self.db = db
+        self.cache = cache
+        self.batch_size = app.config.get('ORPHAN_SWEEP_BATCH', 1000)
+        self.pause = app.config.get('ORPHAN_SWEEP_PAUSE', 0.1)
+        self.interval = app.config.get('ORPHAN_SWEEP_INTERVAL')
+        self._thread = None
+        self._lock = threading.Lock()
+        if self.interval:
+            app.before_request(self.start)
+
+        @app.cli.command('sweep-orphans')
+        @click.option('--batch-size', default=self.batch_size, type=int)
+        def sweep_orphans(batch_size):
+            deleted = self.sweep(batch_size)
+            click.echo(f'Удалено висячих связей: {deleted}')
+
+    def sweep(self, batch_size=None):
+        batch_size = batch_size or self.batch_size
+        connection = self.db.connection()
+        cursor = connection.cursor()
+        # Из нескольких воркеров чистит только один, остальные пропускают проход
+        cursor.execute('SELECT GET_LOCK(%s, 0)', (LOCK_NAME,))
+        if cursor.fetchone()[0] != 1:
+            cursor.close()
+            return 0
+        deleted = 0
+        # связи с удалёнными жанрами: после них меняется books.genre_names
+        renamed = 0
+        try:
+            cursor.execute('SELECT COALESCE(MIN(book_id), 0), COALESCE(MAX(book_id), 0) FROM book_genres')
+            first_id, last_id = cursor.fetchone()
+            # Идём по диапазонам первичного ключа: каждая транзакция короткая и блокирует только свой диапазон
+            for start in range(first_id, last_id + 1, batch_size):
+                end = start + batch_size - 1
+                for table, column in SWEEPS:
+                    cursor.execute(f'''
+                        DELETE bg FROM book_genres bg
+                        LEFT JOIN {table} t ON t.id = bg.{column}
+                        WHERE bg.book_id BETWEEN %s AND %s AND t.id IS NULL
+                    ''', (start, end))
+                    deleted += cursor.rowcount
+                    # У книг пропал жанр: список жанров обновляется в той же транзакции
+                    if table == 'genres' and cursor.rowcount:
+                        renamed += cursor.rowcount
+                        cursor.execute(f'{UPDATE_GENRE_NAMES} WHERE id BETWEEN %s AND %s', (start, end))
+                connection.commit()
+                if self.pause:
+                    time.sleep(self.pause)
+        finally:
+            cursor.execute('SELECT RELEASE_LOCK(%s)', (LOCK_NAME,))
+            cursor.fetchall()
+            cursor.close()
+            if renamed and self.cache is not None:
+                self.cache.bump('catalog')
+        return deleted
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='orphan-sweeper', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.app.app_context():
+                try:
+                    deleted = self.sweep()
+                except mysql.connector.errors.Error as err:
+                    self.app.logger.warning('Orphan sweep failed: %s', err)
+                    continue
+            if deleted:
+                self.app.logger.info('Orphan sweep removed %d links', deleted)
@@ -0,0 +1,245 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from seed import ROOT, DEFAULT_CONFIG, USERS, connect, seed_books, book_count
+
+RESULTS_DIR = os.path.join(ROOT, 'bench', 'results')
+PER_PAGE = 3
+
+
+class Client:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.cookies = {}
+        self.connection = http.client.HTTPConnection(host, port, timeout=30)
+
+    def request(self, method, path, form=None):
+        headers = {}
+        body = None
+        if form is not None:
+            body = urlencode(form, doseq=True)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{key}={value}' for key, value in self.cookies.items())
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            response.read()
+        except (http.client.HTTPException, OSError):
+            self.connection.close()
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            raise
+        for header in response.headers.get_all('Set-Cookie') or []:
+            key, _, value = header.split(';', 1)[0].partition('=')
+            self.cookies[key.strip()] = value
+        return response.status
+
+    def login(self, login, password):
+        return self.request('POST', '/auth/login', {'login': login, 'password': password})
+
+
+def book_form(rng, genre_ids):
+    return {
+        'name': f'Нагрузочная книга {rng.randint(1, 10 ** 9)}',
+        'description': 'Книга, созданная нагрузочным тестом',
+        'year': rng.randint(1900, 2024),
+        'publishing': 'Бенчмарк',
+        'author': 'Бенчмарков',
+        'pages': rng.randint(50, 1200),
+        'genres': rng.sample(genre_ids, min(2, len(genre_ids))),
+    }
+
+
+def scenarios(book_ids, genre_ids, pages):
+    deep = max(pages // 2, 1)
+    return {
+        'index': lambda rng: ('GET', '/', None),
+        'index_deep': lambda rng: ('GET', f'/?page={rng.randint(deep, max(pages, deep))}', None),
+        'show': lambda rng: ('GET', f'/books/show/{rng.choice(book_ids)}', None),
+        'edit_post': lambda rng: ('POST', f'/books/edit/{rng.choice(book_ids)}', book_form(rng, genre_ids)),
+        'create_post': lambda rng: ('POST', '/books/create', book_form(rng, genre_ids)),
+        'login': lambda rng: ('POST', '/auth/login', {'login': USERS[0][0], 'password': USERS[0][1]}),
+    }
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(round(fraction * (len(values) - 1))), len(values) - 1)]
+
+
+def run_scenario(host, port, make_request, concurrency, duration, warmup):
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    stop_at = time.monotonic() + warmup + duration
+    measure_from = time.monotonic() + warmup
+
+    def worker(seed):
+        nonlocal errors
+        rng = random.Random(seed)
+        client = Client(host, port)
+        client.login(USERS[0][0], USERS[0][1])
+        while time.monotonic() < stop_at:
+            method, path, form = make_request(rng)
+            started = time.monotonic()
+            try:
+                status = client.request(method, path, form)
+                failed = status >= 400
+            except (http.client.HTTPException, OSError):
+                failed = True
+            finished = time.monotonic()
+            if started < measure_from:
+                continue
+            with lock:
+                latencies.append(finished - started)
+                errors += failed
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'error_rate': errors / len(latencies) if latencies else None,
+        'throughput': len(latencies) / duration,
+        'p50_ms': percentile(latencies, 0.50) * 1000 if latencies else None,
+        'p95_ms': percentile(latencies, 0.95) * 1000 if latencies else None,
+        'p99_ms': percentile(latencies, 0.99) * 1000 if latencies else None,
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, workers, threads):
+    app_dir = os.path.join(ROOT, 'app')
+    if shutil.which('gunicorn'):
+        command = ['gunicorn', '--workers', str(workers), '--threads', str(threads),
+                   '--bind', f'127.0.0.1:{port}', 'app:app']
+    else:
+        command = [sys.executable, '-m', 'waitress', '--threads', str(workers * threads),
+                   '--listen', f'127.0.0.1:{port}', 'app:app']
+    server = subprocess.Popen(command, cwd=app_dir)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return server
+        except OSError:
+            if server.poll() is not None:
+                raise RuntimeError(f'Сервер завершился с кодом {server.returncode}')
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('Сервер не запустился за 30 секунд')
+
+
+def catalog_ids(connection):
+    cursor = connection.cursor()
+    cursor.execute('SELECT id FROM books ORDER BY RAND() LIMIT 1000')
+    book_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute('SELECT id FROM genres')
+    genre_ids = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    return book_ids, genre_ids
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, previous_path):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    for size, results in current['sizes'].items():
+        for name, result in results.items():
+            old = previous.get('sizes', {}).get(size, {}).get(name)
+            if not old or not old.get('p95_ms') or not result.get('p95_ms'):
+                continue
+            change = (result['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100
+            print(f'{size:>8} {name:<12} p95 {old["p95_ms"]:8.1f} -> {result["p95_ms"]:8.1f} мс ({change:+.0f}%), '
+                  f'{old["throughput"]:7.1f} -> {result["throughput"]:7.1f} запр/с')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест основных страниц')
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000', help='размеры каталога через запятую')
+    parser.add_argument('--scenarios', default=None, help='какие сценарии запускать, через запятую')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--config', default=DEFAULT_CONFIG)
+    parser.add_argument('--compare', help='файл с предыдущими результатами')
+    parser.add_argument('--output', help='куда сохранить результаты (по умолчанию bench/results/)')
+    args = parser.parse_args()
+
+    report = {
+        'revision': git_revision(),
+        'started': datetime.now(timezone.utc).isoformat(),
+        'settings': {key: getattr(args, key) for key in ('concurrency', 'duration', 'warmup', 'workers', 'threads')},
+        'sizes': {},
+    }
+    connection = connect(args.config)
+    for size in (int(size) for size in args.sizes.split(',')):
+        existing = book_count(connection)
+        if existing != size:
+            print(f'Заполнение каталога до {size} книг', file=sys.stderr)
+            seed_books(connection, size if existing > size else size - existing, reset=existing > size)
+        book_ids, genre_ids = catalog_ids(connection)
+        pages = max(size // PER_PAGE, 1)
+        port = free_port()
+        server = start_server(port, args.workers, args.threads)
+        results = {}
+        try:
+            selected = scenarios(book_ids, genre_ids, pages)
+            names = args.scenarios.split(',') if args.scenarios else list(selected)
+            for name in names:
+                result = run_scenario('127.0.0.1', port, selected[name], args.concurrency, args.duration, args.warmup)
+                results[name] = result
+                print(f'{size:>8} {name:<12} {result["throughput"]:8.1f} запр/с  p50 {result["p50_ms"] or 0:7.1f}  '
+                      f'p95 {result["p95_ms"] or 0:7.1f}  p99 {result["p99_ms"] or 0:7.1f} мс  ошибок {result["errors"]}')
+        finally:
+            server.terminate()
+            server.wait()
+        report['sizes'][str(size)] = results
+    connection.close()
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f'{stamp}-{report["revision"] or "unknown"}.json')
+    with open(output, 'w') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'Результаты сохранены в {output}', file=sys.stderr)
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
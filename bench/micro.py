@@ -0,0 +1,140 @@
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from seed import ROOT, USERS
+from loadtest import RESULTS_DIR, git_revision
+
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+os.chdir(os.path.join(ROOT, 'app'))
+
+
+def measure(func, repeat, number):
+    func()
+    timings = []
+    for _ in range(repeat):
+        gc.disable()
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - started) / number)
+        gc.enable()
+    tracemalloc.start()
+    func()
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    func()
+    after = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename') if stat.size_diff > 0)
+    return {
+        'calls': repeat * number,
+        'mean_us': statistics.mean(timings) * 10 ** 6,
+        'min_us': min(timings) * 10 ** 6,
+        'stdev_us': statistics.pstdev(timings) * 10 ** 6,
+        'allocated_bytes': allocated,
+        'peak_bytes': peak,
+    }
+
+
+def materialization(db, rows, repeat):
+    results = {}
+    query = 'SELECT * FROM books ORDER BY id LIMIT %s'
+    for name, options in (('named_tuple', {'named_tuple': True}), ('tuple', {}), ('dict', {'dictionary': True})):
+        def fetch():
+            cursor = db.connection().cursor(**options)
+            cursor.execute(query, (rows,))
+            fetched = cursor.fetchall()
+            cursor.close()
+            return fetched
+        result = measure(fetch, repeat, 1)
+        result['rows_per_second'] = rows / (result['mean_us'] / 10 ** 6)
+        results[f'fetch_{name}'] = result
+    return results
+
+
+def benchmarks(app_module, auth, book_id, user_id):
+    user = auth.load_user(user_id)
+    return {
+        'get_book': lambda: (app_module.loaded_books().clear(), app_module.get_book(book_id)),
+        'get_book_repeated': lambda: app_module.get_book(book_id),
+        'get_books_batch': lambda: (app_module.loaded_books().clear(), app_module.get_books(range(book_id, book_id + 50))),
+        'get_genres_book': lambda: app_module.get_genres_book(book_id),
+        'get_genres_cached': app_module.get_genres,
+        'get_genres_query': app_module.load_genres,
+        'load_user_cached': lambda: auth.load_user(user_id),
+        'load_user_query': lambda: (auth.user_cache.pop(str(user_id)), auth.load_user(user_id)),
+        'user_can': lambda: (user.can('show'), user.can('edit'), user.can('delete')),
+        'index_page': lambda: app_module.get_books_page(1),
+        'index_page_deep': lambda: app_module.get_books_page(max(app_module.get_books_count() // app_module.PER_PAGE, 1)),
+    }
+
+
+def compare(current, previous_path):
+    with open(previous_path) as f:
+        previous = json.load(f)['results']
+    for name, result in current['results'].items():
+        old = previous.get(name)
+        if not old:
+            continue
+        change = (result['mean_us'] - old['mean_us']) / old['mean_us'] * 100
+        print(f'{name:<20} {old["mean_us"]:10.1f} -> {result["mean_us"]:10.1f} мкс ({change:+.0f}%)  '
+              f'память {old["allocated_bytes"]:>8} -> {result["allocated_bytes"]:>8} байт')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Микробенчмарки функций доступа к данным')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=200)
+    parser.add_argument('--rows', type=int, default=10000, help='строк для сравнения named tuple / tuple / dict')
+    parser.add_argument('--only', help='какие замеры запускать, через запятую')
+    parser.add_argument('--compare', help='файл с предыдущими результатами')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    import app as app_module
+    import auth
+
+    results = {}
+    with app_module.app.test_request_context('/'):
+        cursor = app_module.db.connection().cursor()
+        cursor.execute('SELECT id FROM books ORDER BY id LIMIT 1')
+        book_id = cursor.fetchone()[0]
+        cursor.execute('SELECT id FROM users WHERE login = %s', (USERS[0][0],))
+        user_id = cursor.fetchone()[0]
+        cursor.close()
+        selected = benchmarks(app_module, auth, book_id, user_id)
+        names = args.only.split(',') if args.only else list(selected)
+        for name in names:
+            if name in selected:
+                results[name] = measure(selected[name], args.repeat, args.number)
+                print(f'{name:<20} {results[name]["mean_us"]:10.1f} мкс  {results[name]["allocated_bytes"]:>8} байт', file=sys.stderr)
+        if not args.only or any(name.startswith('fetch_') for name in names):
+            for name, result in materialization(app_module.db, args.rows, args.repeat).items():
+                results[name] = result
+                print(f'{name:<20} {result["rows_per_second"]:10.0f} строк/с  {result["peak_bytes"]:>8} байт', file=sys.stderr)
+
+    report = {'revision': git_revision(), 'started': datetime.now(timezone.utc).isoformat(), 'results': results}
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f'micro-{stamp}-{report["revision"] or "unknown"}.json')
+    with open(output, 'w') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'Результаты сохранены в {output}', file=sys.stderr)
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
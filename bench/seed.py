@@ -0,0 +1,130 @@
+import argparse
+import os
+import random
+import runpy
+import sys
+import time
+import mysql.connector
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CONFIG = os.path.join(ROOT, 'app', 'config.py')
+
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+from books import UPDATE_GENRE_NAMES
+
+GENRES = ('Роман', 'Поэзия', 'Драма', 'Детектив', 'Фантастика', 'Фэнтези', 'История', 'Наука', 'Детская литература', 'Приключения')
+USERS = (
+    # login, password, role_id, last_name, first_name
+    ('bench_admin', 'bench', 1, 'Бенчмарков', 'Админ'),
+    ('bench_moder', 'bench', 2, 'Бенчмарков', 'Модератор'),
+    ('bench_user', 'bench', 3, 'Бенчмарков', 'Читатель'),
+)
+ROLE_RIGHTS = {1: ('create', 'show', 'edit', 'delete'), 2: ('show', 'edit'), 3: ('show',)}
+WORDS = ('книга', 'история', 'путь', 'город', 'море', 'время', 'тайна', 'дом', 'ночь', 'свет', 'война', 'мир', 'сад', 'зима', 'лето')
+
+
+def load_config(path=DEFAULT_CONFIG):
+    config = runpy.run_path(path)
+    return {
+        'user': config['MYSQL_USER'],
+        'password': config['MYSQL_PASSWORD'],
+        'host': config['MYSQL_HOST'],
+        'database': config['MYSQL_DATABASE'],
+    }
+
+
+def connect(config_path=DEFAULT_CONFIG):
+    return mysql.connector.connect(**load_config(config_path))
+
+
+def phrase(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def ensure_reference_data(connection):
+    cursor = connection.cursor()
+    cursor.execute('SELECT id FROM roles')
+    roles = {row[0] for row in cursor.fetchall()}
+    for role_id, name in ((1, 'Администратор'), (2, 'Модератор'), (3, 'Пользователь')):
+        if role_id not in roles:
+            cursor.execute('INSERT INTO roles (id, name, description) VALUES (%s, %s, %s)', (role_id, name, name))
+    cursor.executemany('INSERT IGNORE INTO role_permissions (role_id, action) VALUES (%s, %s)',
+                       [(role_id, action) for role_id, actions in ROLE_RIGHTS.items() for action in actions])
+    cursor.execute('SELECT name FROM genres')
+    existing = {row[0] for row in cursor.fetchall()}
+    cursor.executemany('INSERT INTO genres (name) VALUES (%s)', [(name,) for name in GENRES if name not in existing])
+    for login, password, role_id, last_name, first_name in USERS:
+        cursor.execute('SELECT id FROM users WHERE login = %s', (login,))
+        if cursor.fetchone() is None:
+            cursor.execute('''
+                INSERT INTO users (login, password_hash, last_name, first_name, role_id)
+                VALUES (%s, SHA2(%s, 256), %s, %s, %s)
+            ''', (login, password, last_name, first_name, role_id))
+    connection.commit()
+    cursor.execute('SELECT id FROM genres')
+    genre_ids = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    return genre_ids
+
+
+def seed_books(connection, count, batch_size=5000, reset=False, seed=42, progress=True):
+    rng = random.Random(seed)
+    genre_ids = ensure_reference_data(connection)
+    cursor = connection.cursor()
+    if reset:
+        cursor.execute('DELETE FROM book_genres')
+        cursor.execute('DELETE FROM books')
+        connection.commit()
+    started = time.monotonic()
+    written = 0
+    while written < count:
+        size = min(batch_size, count - written)
+        books = [
+            (phrase(rng, 3), phrase(rng, 12), rng.randint(1900, 2024), phrase(rng, 2), phrase(rng, 2), rng.randint(50, 1200))
+            for _ in range(size)
+        ]
+        cursor.executemany('''
+            INSERT INTO books (name, description, year, publishing, author, pages)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        ''', books)
+        first_id = cursor.lastrowid
+        links = [
+            (first_id + i, genre_id)
+            for i in range(size)
+            for genre_id in rng.sample(genre_ids, rng.randint(1, min(3, len(genre_ids))))
+        ]
+        cursor.executemany('INSERT INTO book_genres (book_id, genre_id) VALUES (%s, %s)', links)
+        cursor.execute(f'{UPDATE_GENRE_NAMES} WHERE id BETWEEN %s AND %s', (first_id, first_id + size - 1))
+        connection.commit()
+        written += size
+        if progress:
+            print(f'\r{written}/{count} книг, {written / (time.monotonic() - started):.0f} книг/с', end='', file=sys.stderr)
+    if progress:
+        print(file=sys.stderr)
+    cursor.close()
+
+
+def book_count(connection):
+    cursor = connection.cursor()
+    cursor.execute('SELECT COUNT(*) FROM books')
+    count = cursor.fetchone()[0]
+    cursor.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Заполнить базу тестовыми книгами')
+    parser.add_argument('books', type=int, help='сколько книг должно быть в каталоге')
+    parser.add_argument('--config', default=DEFAULT_CONFIG)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--reset', action='store_true', help='удалить существующие книги перед заполнением')
+    args = parser.parse_args()
+    connection = connect(args.config)
+    existing = 0 if args.reset else book_count(connection)
+    seed_books(connection, max(args.books - existing, 0), batch_size=args.batch_size, reset=args.reset)
+    connection.close()
+
+
+if __name__ == '__main__':
+    main()